@@ -1,6 +1,8 @@
+import logging
 import os
 
 from celery import Celery
+from celery.signals import worker_process_init
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.local")
@@ -15,3 +17,14 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
+
+
+@worker_process_init.connect
+def warm_up_worker_process(**kwargs):
+    """Document templates are compiled once per worker process before the first task"""
+    from crm.companies.services import document_templates_warm_up
+
+    try:
+        document_templates_warm_up()
+    except Exception:
+        logging.getLogger(__name__).exception("Document templates warm-up failed")
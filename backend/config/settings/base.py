@@ -139,6 +139,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "crm.companies.middleware.TenantContextMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -296,6 +297,52 @@ CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
 CELERY_TASK_SEND_SENT_EVENT = True
+# Max number of CompanyProductLink integrations running in parallel:
+# concurrency of the worker consuming PRODUCTS_INTEGRATION_QUEUE and of products_async_integration_task downloads
+PRODUCTS_INTEGRATION_CONCURRENCY = env.int("PRODUCTS_INTEGRATION_CONCURRENCY", default=4)
+# Queue of single link integration tasks, consumed by a dedicated worker
+PRODUCTS_INTEGRATION_QUEUE = env("PRODUCTS_INTEGRATION_QUEUE", default="products_integration")
+# Seconds a single link integration may run, includes feed download, build and save stages
+PRODUCTS_INTEGRATION_LINK_SOFT_TIME_LIMIT = env.int(
+    "PRODUCTS_INTEGRATION_LINK_SOFT_TIME_LIMIT", default=15 * 60
+)
+PRODUCTS_INTEGRATION_LINK_TIME_LIMIT = env.int("PRODUCTS_INTEGRATION_LINK_TIME_LIMIT", default=20 * 60)
+# Seconds products_async_integration_task may run, includes every link of a full sync
+PRODUCTS_INTEGRATION_SOFT_TIME_LIMIT = env.int("PRODUCTS_INTEGRATION_SOFT_TIME_LIMIT", default=2 * 60 * 60)
+PRODUCTS_INTEGRATION_TIME_LIMIT = env.int("PRODUCTS_INTEGRATION_TIME_LIMIT", default=2 * 60 * 60 + 15 * 60)
+# Seconds product_retranslate_task may run, it refreshes translations of every product having the keys
+PRODUCT_RETRANSLATE_SOFT_TIME_LIMIT = env.int("PRODUCT_RETRANSLATE_SOFT_TIME_LIMIT", default=30 * 60)
+PRODUCT_RETRANSLATE_TIME_LIMIT = env.int("PRODUCT_RETRANSLATE_TIME_LIMIT", default=35 * 60)
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#task-routes
+CELERY_TASK_ROUTES = {
+    "crm.companies.tasks.product_link_integration_task": {"queue": PRODUCTS_INTEGRATION_QUEUE},
+}
+# Render commercial offers by celery task instead of request, offer action responds with task id
+PRODUCT_OFFER_ASYNC = env.bool("PRODUCT_OFFER_ASYNC", default=False)
+# Max number of products in a single batch of commercial offers
+PRODUCT_OFFER_BATCH_MAX_SIZE = env.int("PRODUCT_OFFER_BATCH_MAX_SIZE", default=100)
+# Seconds commercial offer of a single product may be rendered by celery task
+PRODUCT_OFFER_RENDER_SOFT_TIME_LIMIT = env.int("PRODUCT_OFFER_RENDER_SOFT_TIME_LIMIT", default=2 * 60)
+PRODUCT_OFFER_RENDER_TIME_LIMIT = env.int("PRODUCT_OFFER_RENDER_TIME_LIMIT", default=3 * 60)
+# Seconds offers of the whole batch may be merged and saved, sized from the batch cap
+PRODUCT_OFFER_BATCH_SOFT_TIME_LIMIT = env.int(
+    "PRODUCT_OFFER_BATCH_SOFT_TIME_LIMIT", default=60 + PRODUCT_OFFER_BATCH_MAX_SIZE * 2
+)
+PRODUCT_OFFER_BATCH_TIME_LIMIT = env.int(
+    "PRODUCT_OFFER_BATCH_TIME_LIMIT", default=PRODUCT_OFFER_BATCH_SOFT_TIME_LIMIT + 60
+)
+
+# Product feeds HTTP client
+# -------------------------------------------------------------------------------
+# Max number of simultaneous requests to a single feed host from one worker process
+FEED_CLIENT_MAX_CONNECTIONS_PER_HOST = env.int("FEED_CLIENT_MAX_CONNECTIONS_PER_HOST", default=2)
+# Min seconds between requests to a single feed host from one worker process
+FEED_CLIENT_MIN_INTERVAL = env.float("FEED_CLIENT_MIN_INTERVAL", default=0.5)
+# Attempts for connection errors, timeouts, 429 and 5xx responses
+FEED_CLIENT_MAX_ATTEMPTS = env.int("FEED_CLIENT_MAX_ATTEMPTS", default=3)
+# Exponential backoff between attempts: random in [base * 2^n / 2, base * 2^n], capped by max
+FEED_CLIENT_BACKOFF_BASE = env.float("FEED_CLIENT_BACKOFF_BASE", default=0.5)
+FEED_CLIENT_BACKOFF_MAX = env.float("FEED_CLIENT_BACKOFF_MAX", default=30.0)
 
 # django-rest-framework
 # -------------------------------------------------------------------------------
@@ -363,6 +410,38 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
 
+# Documents
+# -------------------------------------------------------------------------------
+# Seconds QR code data uri is kept in the cache, keyed by its data
+QR_CODE_CACHE_TIMEOUT = env.int("QR_CODE_CACHE_TIMEOUT", default=60 * 60 * 24 * 30)
+# Seconds rendered PDF is kept in the cache, keyed by the hash of its sources
+PDF_CACHE_TIMEOUT = env.int("PDF_CACHE_TIMEOUT", default=60 * 60 * 24)
+# PDF larger than this number of bytes is not cached
+PDF_CACHE_MAX_SIZE = env.int("PDF_CACHE_MAX_SIZE", default=5 * 1024 * 1024)
+# Number of processes rendering PDF outside of request threads, 0 - render in the current thread
+# !!! Web process only: daemonic celery prefork children can't start the pool and render in the task thread
+PDF_RENDER_PROCESSES = env.int("PDF_RENDER_PROCESSES", default=0)
+# Number of decoded images and image data entries kept by each renderer between renders
+PDF_IMAGE_CACHE_SIZE = env.int("PDF_IMAGE_CACHE_SIZE", default=256)
+# Seconds pre-signed url of document download is valid for
+DOCUMENT_PRESIGNED_URL_EXPIRE = env.int("DOCUMENT_PRESIGNED_URL_EXPIRE", default=60 * 5)
+# Seconds downloaded document may be kept by the browser cache
+DOCUMENT_CACHE_MAX_AGE = env.int("DOCUMENT_CACHE_MAX_AGE", default=60 * 60)
+
+# Search
+# -------------------------------------------------------------------------------
+# Shorter typeahead query is matched by prefix instead of trigram similarity
+TRIGRAM_SEARCH_MIN_LENGTH = env.int("TRIGRAM_SEARCH_MIN_LENGTH", default=3)
+# Max number of rows found by typeahead query
+TRIGRAM_SEARCH_MAX_RESULTS = env.int("TRIGRAM_SEARCH_MAX_RESULTS", default=50)
+
+# Pagination
+# -------------------------------------------------------------------------------
+# Seconds count of paginated list is kept in the cache by "cached" count strategy
+PAGINATION_COUNT_CACHE_TIMEOUT = env.int("PAGINATION_COUNT_CACHE_TIMEOUT", default=60)
+# Smaller planner estimate is replaced by exact count by "estimated" count strategy
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = env.int("PAGINATION_COUNT_ESTIMATE_THRESHOLD", default=10000)
+
 # django-bleach
 # -------------------------------------------------------------------------------
 # Which HTML tags are allowed
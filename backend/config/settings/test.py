@@ -28,3 +28,8 @@ EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
 # DEBUGGING FOR TEMPLATES
 # ------------------------------------------------------------------------------
 TEMPLATES[0]["OPTIONS"]["debug"] = True  # type: ignore # noqa: F405
+
+# PRODUCT FEEDS
+# ------------------------------------------------------------------------------
+FEED_CLIENT_MIN_INTERVAL = 0
+FEED_CLIENT_BACKOFF_BASE = 0
@@ -13,6 +13,7 @@ middleware here, or combine a Django application with an application of another
 framework.
 
 """
+import logging
 import os
 import sys
 from pathlib import Path
@@ -33,6 +34,16 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
 # file. This includes Django's development server, if the WSGI_APPLICATION
 # setting points here.
 application = get_wsgi_application()
+
+# Compile document templates before the first request of the worker,
+# failed warm-up must not prevent the application from starting
+from crm.companies.services import document_templates_warm_up  # noqa: E402
+
+try:
+    document_templates_warm_up()
+except Exception:
+    logging.getLogger(__name__).exception("Document templates warm-up failed")
+
 # Apply WSGI middleware here.
 # from helloworld.wsgi import HelloWorldApplication
 # application = HelloWorldApplication(application)
@@ -9,7 +9,14 @@ class CompanyProductLinkSerializer(serializers.ModelSerializer):
     class Meta:
         model = CompanyProductLink
         fields = "__all__"
-        read_only_fields = ["is_valid"]
+        read_only_fields = [
+            "is_valid",
+            "connect_timeout",
+            "read_timeout",
+            "etag",
+            "last_modified",
+            "content_hash",
+        ]
 
     details = serializers.HyperlinkedIdentityField(view_name="api:companyproductlink-detail")
 
@@ -1,8 +1,6 @@
 import django_filters
-from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.permissions import DjangoModelPermissions, IsAuthenticated
-from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
 from crm.companies.models import CompanyProductLink
@@ -10,12 +8,18 @@ from crm.companies.selectors import company_product_link_list
 from crm.companies.tasks import parse_product_task
 from crm.core.pagination import PageNumberPagination
 
-from ..mixins import BaseFilter, CreateInfoMixin, DeleteMultipleMixin, DeleteMultipleSerializer
+from ..mixins import (
+    BaseFilter,
+    CreateInfoMixin,
+    DeleteMultipleMixin,
+    DeleteMultipleSerializer,
+    TaskResponseMixin,
+)
 from ..permissions import IsAdminPermission, IsSuperPermission, validate_company_product_link
 from .serializers import CompanyProductLinkSerializer, ParseSerializer
 
 
-class CompanyProductLinkViewset(CreateInfoMixin, DeleteMultipleMixin, ModelViewSet):
+class CompanyProductLinkViewset(CreateInfoMixin, DeleteMultipleMixin, TaskResponseMixin, ModelViewSet):
     class Pagination(PageNumberPagination):
         page_size = 10
 
@@ -59,6 +63,4 @@ class CompanyProductLinkViewset(CreateInfoMixin, DeleteMultipleMixin, ModelViewS
         company_product_link = self.get_object()
         validate_company_product_link(company_product_link)
         task_result = parse_product_task.delay(company_product_link.pk)
-        task_absolute_url = request.build_absolute_uri(f"/api/tasks/{task_result.id}/")
-        response = {"task_id": task_result.id, "task_url": task_absolute_url}
-        return Response(response, status=status.HTTP_200_OK)
+        return self.task_response(task_result)
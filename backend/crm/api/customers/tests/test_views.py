@@ -247,6 +247,17 @@ class CustomerViewsetTests(APITestCaseForChads):
     def test_list(self):
         self.get_request_factory(self.urls["list"], self.list_cases)
 
+    def test_list_search(self):
+        customer = CustomerFactory(
+            company=self.company, last_name="Константинопольский", phone_number="+79001234567"
+        )
+        CustomerFactory(company=self.other_company, last_name="Константинопольский")
+        self.authorize(self.manager)
+        for search in ["Ко", "Константинополский", "+7900123"]:
+            response = self.client.get(self.urls["list"], {"search": search})
+            self.assertIn(customer.id, [item["id"] for item in response.data["items"]], search)
+            self.assertEqual(response.data["count"], 1, search)
+
     def test_create(self):
         self.post_request_factory(self.urls["list"], self.create_cases)
 
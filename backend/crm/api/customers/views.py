@@ -5,12 +5,18 @@ from rest_framework.viewsets import ModelViewSet
 from crm.companies.selectors import customer_list
 from crm.core.pagination import PageNumberPagination
 
-from ..mixins import BaseFilter, CreateInfoMixin, DeleteMultipleMixin, DeleteMultipleSerializer
+from ..mixins import (
+    BaseFilter,
+    CreateInfoMixin,
+    DeleteMultipleMixin,
+    DeleteMultipleSerializer,
+    TrigramSearchMixin,
+)
 from ..permissions import IsAdminPermission, IsSuperPermission
 from .serializers import Customer, CustomerSerializer
 
 
-class CustomerViewset(CreateInfoMixin, DeleteMultipleMixin, ModelViewSet):
+class CustomerViewset(TrigramSearchMixin, CreateInfoMixin, DeleteMultipleMixin, ModelViewSet):
     class Pagination(PageNumberPagination):
         page_size = 10
 
@@ -27,6 +33,7 @@ class CustomerViewset(CreateInfoMixin, DeleteMultipleMixin, ModelViewSet):
 
     def get_queryset(self):
         customers = customer_list(self.request.user)
+        customers = self.trigram_search(customers, ["first_name", "last_name", "phone_number"])
         return customers
 
     def get_serializer_class(self):
@@ -38,7 +38,7 @@ class DealListSerializer(DealValidationMixin, serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.select_related("company"))
     manager = serializers.ReadOnlyField(source="manager.username")
     customer = CustomerSerializer()
-    company = serializers.ReadOnlyField(source="product.company.id")
+    company = serializers.ReadOnlyField(source="company_id")
 
     def create(self, validated_data):
         validated_data["manager"] = self.context["request"].user
@@ -57,7 +57,7 @@ class DealDetailSerializer(DealValidationMixin, serializers.ModelSerializer):
     details = serializers.HyperlinkedIdentityField(view_name="api:deal-detail")
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.select_related("company"))
     manager = serializers.ReadOnlyField(source="manager.username", default=None)
-    company = serializers.ReadOnlyField(source="product.company.id")
+    company = serializers.ReadOnlyField(source="company_id")
 
     def validate_customer(self, value):
         super().validate_customer(value)
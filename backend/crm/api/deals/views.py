@@ -3,7 +3,7 @@ from rest_framework.permissions import DjangoModelPermissions, IsAuthenticated
 from rest_framework.viewsets import ModelViewSet
 
 from crm.companies.selectors import deal_list
-from crm.core.pagination import PageNumberPagination
+from crm.core.pagination import KeysetPagination, PageNumberPagination
 
 from ..mixins import BaseFilter, CreateInfoMixin, DeleteMultipleMixin, DeleteMultipleSerializer
 from ..permissions import IsAdminPermission, IsSuperPermission
@@ -13,6 +13,8 @@ from .serializers import Deal, DealDetailSerializer, DealListSerializer
 class DealViewset(CreateInfoMixin, DeleteMultipleMixin, ModelViewSet):
     class Pagination(PageNumberPagination):
         page_size = 10
+        count_strategy = "cached"
+        keyset_pagination_class = KeysetPagination
 
     class Filter(BaseFilter):
         class Meta:
@@ -22,7 +24,7 @@ class DealViewset(CreateInfoMixin, DeleteMultipleMixin, ModelViewSet):
         manager = django_filters.CharFilter(field_name="manager__username")
         customer = django_filters.CharFilter(field_name="customer__id")
         product = django_filters.CharFilter(field_name="product__id")
-        company = django_filters.CharFilter(field_name="product__company__id", label="Компания ID")
+        company = django_filters.CharFilter(field_name="company__id", label="Компания ID")
 
     queryset = Deal.objects.none()
     pagination_class = Pagination
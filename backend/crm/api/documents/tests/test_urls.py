@@ -16,3 +16,10 @@ def test_document_detail(document: Document):
 def test_document_ids():
     assert reverse("api:document-ids") == "/api/v1/documents/ids/"
     assert resolve("/api/v1/documents/ids/").view_name == "api:document-ids"
+
+
+def test_document_download(document: Document):
+    assert (
+        reverse("api:document-download", args=[document.id]) == f"/api/v1/documents/{document.id}/download/"
+    )
+    assert resolve(f"/api/v1/documents/{document.id}/download/").view_name == "api:document-download"
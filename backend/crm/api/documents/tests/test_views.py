@@ -1,3 +1,6 @@
+import tempfile
+
+from django.core.files.base import ContentFile
 from django.urls import reverse
 from faker import Faker
 from rest_framework import status
@@ -40,6 +43,7 @@ class DocumentViewsetTests(APITestCaseForChads):
             "detail": reverse("api:document-detail", args=[self.document.id]),
             "detail_raw": "api:document-detail",
             "ids": reverse("api:document-ids"),
+            "download_raw": "api:document-download",
         }
         # list test cases
         self.list_cases = [  # (current_user, response_status, info_msg)
@@ -197,3 +201,55 @@ class DocumentViewsetTests(APITestCaseForChads):
 
     def test_action_multiple_delete_post(self):
         self.post_request_factory(self.urls["ids"], self.action_multiple_delete_post_cases)
+
+    def test_action_download(self):
+        self.authorize(self.manager)
+        with tempfile.TemporaryDirectory() as directory, self.settings(MEDIA_ROOT=directory):
+            document = DocumentFactory(product=self.product, url=ContentFile(b"0123456789", name="offer.pdf"))
+            url = reverse(self.urls["download_raw"], args=[document.id])
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+            self.assertEqual(response["Content-Length"], "10")
+            self.assertEqual(response["Content-Type"], "application/pdf")
+            self.assertEqual(response["Accept-Ranges"], "bytes")
+            self.assertIn("attachment", response["Content-Disposition"])
+            self.assertIn("private", response["Cache-Control"])
+            etag = response["ETag"]
+            # Test unchanged document is not sent again
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            # Test ranges
+            test_cases = [  # (range, if_range, response_status, content, content_range)
+                ("bytes=2-5", etag, status.HTTP_206_PARTIAL_CONTENT, b"2345", "bytes 2-5/10"),
+                ("bytes=7-", None, status.HTTP_206_PARTIAL_CONTENT, b"789", "bytes 7-9/10"),
+                ("bytes=-3", None, status.HTTP_206_PARTIAL_CONTENT, b"789", "bytes 7-9/10"),
+                ("bytes=2-5", '"changed"', status.HTTP_200_OK, b"0123456789", None),
+                ("bytes=0-1,4-5", None, status.HTTP_200_OK, b"0123456789", None),
+                ("bytes=10-", None, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, b"", "bytes */10"),
+            ]
+            for range_header, if_range, response_status, content, content_range in test_cases:
+                headers = {"HTTP_RANGE": range_header}
+                if if_range:
+                    headers["HTTP_IF_RANGE"] = if_range
+                response = self.client.get(url, **headers)
+                self.assertEqual(response.status_code, response_status, range_header)
+                streaming_content = (
+                    b"".join(response.streaming_content) if response.streaming else response.content
+                )
+                self.assertEqual(streaming_content, content, range_header)
+                self.assertEqual(response.get("Content-Range"), content_range, range_header)
+
+    def test_action_download_not_found(self):
+        self.authorize(self.superuser)
+        test_cases = [  # (document, info_msg)
+            (self.other_document, "SUPERUSER can't download other document"),
+            (self.document, "SUPERUSER can't download document without file"),
+            (
+                DocumentFactory(product=self.product, url=""),
+                "SUPERUSER can't download document with empty file",
+            ),
+        ]
+        for document, info_msg in test_cases:
+            response = self.client.get(reverse(self.urls["download_raw"], args=[document.id]))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, info_msg)
@@ -1,18 +1,27 @@
+import hashlib
+
 import django_filters
+from django.conf import settings
+from django.http import HttpResponseRedirect
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.mixins import DestroyModelMixin, ListModelMixin, RetrieveModelMixin, UpdateModelMixin
 from rest_framework.permissions import DjangoModelPermissions, IsAuthenticated
 from rest_framework.viewsets import GenericViewSet
 
 from crm.companies.selectors import document_list
-from crm.core.pagination import PageNumberPagination
+from crm.core.pagination import KeysetPagination, PageNumberPagination
 
-from ..mixins import BaseFilter, DeleteMultipleMixin, DeleteMultipleSerializer
+from ..mixins import BaseFilter, DeleteMultipleMixin, DeleteMultipleSerializer, FileResponseMixin
 from ..permissions import IsAdminPermission, IsSuperPermission
 from .serializers import Document, DocumentDetailSerializer, DocumentSerializer
 
 
 class DocumentViewset(
     DeleteMultipleMixin,
+    FileResponseMixin,
     ListModelMixin,
     RetrieveModelMixin,
     UpdateModelMixin,
@@ -21,6 +30,8 @@ class DocumentViewset(
 ):
     class Pagination(PageNumberPagination):
         page_size = 10
+        count_strategy = "cached"
+        keyset_pagination_class = KeysetPagination
 
     class Filter(BaseFilter):
         class Meta:
@@ -29,7 +40,7 @@ class DocumentViewset(
 
         user = django_filters.CharFilter(field_name="url", lookup_expr="icontains")
         product = django_filters.CharFilter(field_name="product__id")
-        company = django_filters.CharFilter(field_name="product__company__id")
+        company = django_filters.CharFilter(field_name="company__id")
 
     queryset = Document.objects.none()
     pagination_class = Pagination
@@ -57,3 +68,33 @@ class DocumentViewset(
         if self.action == "ids":
             permission_classes += [IsSuperPermission | IsAdminPermission]
         return [permission() for permission in permission_classes]
+
+    @action(detail=True, methods=["get"])
+    def download(self, request, pk=None):
+        """
+        Document file is redirected to a pre-signed url if storage supports it, otherwise streamed with Range support.
+        Files are never overwritten, so ETag is the hash of the file name.
+        """
+        document = self.get_object()
+        if not document.url:
+            raise NotFound({"url": "Файл документа не найден"})
+        file_name = document.url.name.rsplit("/", 1)[-1]
+        storage = document.url.storage
+
+        if hasattr(storage, "presigned_url"):
+            disposition = content_disposition_header(True, file_name)
+            url = storage.presigned_url(
+                document.url.name,
+                expire=settings.DOCUMENT_PRESIGNED_URL_EXPIRE,
+                parameters={"ResponseContentDisposition": disposition},
+            )
+            response = HttpResponseRedirect(url)
+            patch_cache_control(response, private=True, no_store=True)
+            return response
+
+        if not storage.exists(document.url.name):
+            raise NotFound({"url": "Файл документа не найден"})
+        etag = f'"{hashlib.sha256(document.url.name.encode("utf-8")).hexdigest()}"'
+        response = self.file_response(document.url, file_name, etag=etag, disposition="attachment")
+        patch_cache_control(response, private=True, max_age=settings.DOCUMENT_CACHE_MAX_AGE)
+        return response
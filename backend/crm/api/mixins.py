@@ -1,5 +1,22 @@
-from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+import mimetypes
+import re
+from functools import reduce
+from operator import or_
+
+from celery.result import AsyncResult
+from django.conf import settings
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.core.cache import cache
+from django.core.files import File
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Length, Upper
+from django.db.models.lookups import StartsWith
 from django.db.models.query import QuerySet
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header
 from django_filters.rest_framework import FilterSet
 from rest_framework import serializers, status
 from rest_framework.decorators import action
@@ -48,9 +65,20 @@ class DeleteMultipleMixin:
 
 
 class VectorSearchMixin:
-    def search(self, queryset: QuerySet, search_fields: list) -> QuerySet:
+    def search(self, queryset: QuerySet, search_fields: list = None, vector_field: str = None) -> QuerySet:
+        """
+        Full text search by ?search= param, ordered by rank.
+        Stored and indexed [vector_field] is preferred, vector of [search_fields] is built for every row.
+        """
         search_query = self.request.query_params.get("search")
-        if search_query:
+        if search_query and vector_field:
+            search_query = SearchQuery(search_query)
+            queryset = (
+                queryset.filter(**{vector_field: search_query})
+                .annotate(rank=SearchRank(F(vector_field), search_query))
+                .order_by("-rank")
+            )
+        elif search_query:
             search_vector = SearchVector(*search_fields)
             search_query = SearchQuery(search_query)
             queryset = (
@@ -59,3 +87,130 @@ class VectorSearchMixin:
                 .order_by("-rank")
             )
         return queryset
+
+
+class TrigramSearchMixin:
+    def trigram_search(self, queryset: QuerySet, search_fields: list) -> QuerySet:
+        """
+        Typeahead search by ?search= param, [search_fields] need gin_trgm_ops indexes on their upper case.
+        Query shorter than TRIGRAM_SEARCH_MIN_LENGTH is matched by prefix, longer - by trigram word similarity.
+        Result is capped by TRIGRAM_SEARCH_MAX_RESULTS rows: the most similar ones,
+        or for prefix the shortest values of the first search field, then by id.
+        """
+        search_query = self.request.query_params.get("search", "").strip()
+        if not search_query:
+            return queryset
+
+        fields = [Upper(field) for field in search_fields]
+        if len(search_query) < settings.TRIGRAM_SEARCH_MIN_LENGTH:
+            condition = reduce(or_, [StartsWith(field, Upper(Value(search_query))) for field in fields])
+            rank = None
+            ordering = [Length(search_fields[0]), "pk"]
+        else:
+            condition = reduce(or_, [TrigramWordSimilar(field, search_query) for field in fields])
+            ranks = [TrigramWordSimilarity(search_query, field) for field in fields]
+            rank = Greatest(*ranks) if len(ranks) > 1 else ranks[0]
+            ordering = [rank.desc(), "pk"]
+
+        matched = queryset.filter(condition).order_by(*ordering)
+        # Cap by subquery, so the result can still be filtered and paginated
+        queryset = queryset.filter(pk__in=matched.values("pk")[: settings.TRIGRAM_SEARCH_MAX_RESULTS])
+        if rank is not None:
+            queryset = queryset.annotate(rank=rank).order_by("-rank")
+        return queryset
+
+
+# user who started the task, only they may read its status, kept as long as celery results
+TASK_OWNER_CACHE_KEY = "task_owner"
+TASK_OWNER_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class TaskResponseMixin:
+    def task_response(self, task_result: AsyncResult, status_code: int = status.HTTP_200_OK) -> Response:
+        """Response with id and status url of the started celery task, the task is owned by request user"""
+        cache.set(f"{TASK_OWNER_CACHE_KEY}:{task_result.id}", self.request.user.pk, TASK_OWNER_CACHE_TIMEOUT)
+        task_absolute_url = self.request.build_absolute_uri(reverse("api:task-detail", args=[task_result.id]))
+        response = {"task_id": task_result.id, "task_url": task_absolute_url}
+        return Response(response, status=status_code)
+
+
+def iter_file_range(file: File, start: int, length: int, chunk_size: int = 64 * 1024):
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+class FileResponseMixin:
+    range_re = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+    def get_byte_range(self, size: int, etag: str = None) -> tuple[int, int] | None:
+        """
+        Inclusive (start, end) of a single byte range requested by Range header.
+        None - whole file is sent: no range, multiple or malformed ranges, If-Range does not match [etag].
+        Raise ValueError if range is not satisfiable.
+        """
+        header = self.request.META.get("HTTP_RANGE", "").strip()
+        if_range = self.request.META.get("HTTP_IF_RANGE")
+        match = self.range_re.match(header)
+        if not match or match.groups() == ("", "") or (if_range and if_range != etag):
+            return None
+        start, end = match.groups()
+        if not start:
+            # Suffix range: the last [end] bytes
+            start, end = max(size - int(end), 0), size - 1
+            if start > end:
+                raise ValueError(header)
+            return start, end
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+        if start >= size:
+            raise ValueError(header)
+        return (start, end) if start <= end else None
+
+    def file_response(
+        self,
+        file: File,
+        file_name: str,
+        etag: str = None,
+        disposition: str = "inline",
+        content_type: str = None,
+    ) -> HttpResponse:
+        """
+        Streamed file response with Content-Length, ETag and single byte Range support.
+        Request with matching If-None-Match gets 304 without opening the file.
+        """
+        if etag:
+            response = get_conditional_response(self.request, etag=etag)
+            if response is not None:
+                return response
+
+        content_type = content_type or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        try:
+            byte_range = self.get_byte_range(file.size, etag)
+        except ValueError:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response["Content-Range"] = f"bytes */{file.size}"
+            return response
+
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                iter_file_range(file.open("rb"), start, end - start + 1),
+                status=status.HTTP_206_PARTIAL_CONTENT,
+                content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {start}-{end}/{file.size}"
+            response["Content-Length"] = end - start + 1
+        response["Accept-Ranges"] = "bytes"
+        response["Content-Disposition"] = content_disposition_header(disposition == "attachment", file_name)
+        if etag:
+            response["ETag"] = etag
+        return response
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from crm.companies.models import Product
@@ -13,7 +14,7 @@ class ImagesField(serializers.RelatedField):
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ["search_vector"]
         read_only_fields = ["pid", "images"]
 
     details = serializers.HyperlinkedIdentityField(view_name="api:product-detail")
@@ -28,3 +29,10 @@ class ProductSerializer(serializers.ModelSerializer):
 class OfferSerializer(serializers.Serializer):
     name = serializers.CharField(max_length=150)
     pdf_blocks = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+
+class OfferBatchSerializer(OfferSerializer):
+    products = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=settings.PRODUCT_OFFER_BATCH_MAX_SIZE
+    )
+    merge = serializers.BooleanField(default=False)
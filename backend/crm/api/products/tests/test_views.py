@@ -8,8 +8,10 @@ from crm.companies.tests.factories import (
     CompanyMemberFactory,
     Product,
     ProductFactory,
+    ProductTranslationFactory,
     gen_product_data,
 )
+from crm.core.utils import DOCX_CONTENT_TYPE
 from crm.documents.tests.factories import Document
 from crm.users.tests.factories import AdminUserFactory, ManagerUserFactory, SuperUserFactory
 
@@ -45,6 +47,7 @@ class ProductViewsetTests(APITestCaseForChads):
             "ids": reverse("api:product-ids"),
             "price": reverse("api:product-price", args=[self.product.id]),
             "offer": reverse("api:product-offer", args=[self.product.id]),
+            "offers": reverse("api:product-offers"),
         }
         # pdf generation
         self.expected_pdf_file_name = f"{self.superuser.username}-{self.product.pk}.pdf"
@@ -241,6 +244,49 @@ class ProductViewsetTests(APITestCaseForChads):
     def test_create(self):
         self.post_request_factory(self.urls["list"], self.create_cases)
 
+    def test_list_search_translated(self):
+        ProductTranslationFactory(key="brand", value="Производитель")
+        product = ProductFactory(company=self.company)
+        self.authorize(self.superuser)
+        response = self.client.get(self.urls["list"], {"search": "Производитель"})
+        self.assertEqual([item["id"] for item in response.data["items"]], [product.id])
+
+    def test_list_cursor(self):
+        ProductFactory.create_batch(11, company=self.company)
+        self.authorize(self.superuser)
+        response = self.client.get(self.urls["list"], {"cursor": ""})
+        self.assertNotIn("count", response.data)
+        self.assertEqual(len(response.data["items"]), 10)
+        response = self.client.get(self.urls["list"], {"cursor": response.data["nextCursor"]})
+        self.assertEqual(
+            len(response.data["items"]), Product.objects.filter(company=self.company).count() - 10
+        )
+        self.assertIsNone(response.data["nextCursor"])
+
+    def test_list_search_trigram(self):
+        product = ProductFactory(company=self.company, name="Galaxy S23")
+        ProductFactory(company=self.company, name="Galaxy S22")
+        ProductFactory(company=self.other_company, name="Galaxy S23")
+        self.authorize(self.superuser)
+        # Test typo is matched by trigram similarity, best match first
+        response = self.client.get(self.urls["list"], {"search": "Galxy S23", "searchMode": "trigram"})
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(response.data["items"][0]["id"], product.id)
+        # Test short query is matched by prefix
+        shortest = ProductFactory(company=self.company, name="Galaxy")
+        response = self.client.get(self.urls["list"], {"search": "ga", "searchMode": "trigram"})
+        self.assertEqual(response.data["count"], 3)
+        # Test prefix matches are capped shortest first, though it is the latest product
+        with self.settings(TRIGRAM_SEARCH_MAX_RESULTS=1):
+            response = self.client.get(self.urls["list"], {"search": "ga", "searchMode": "trigram"})
+        self.assertEqual([item["id"] for item in response.data["items"]], [shortest.id])
+        response = self.client.get(self.urls["list"], {"search": "s2", "searchMode": "trigram"})
+        self.assertEqual(response.data["count"], 0)
+        # Test result is capped
+        with self.settings(TRIGRAM_SEARCH_MAX_RESULTS=1):
+            response = self.client.get(self.urls["list"], {"search": "galaxy", "searchMode": "trigram"})
+        self.assertEqual(response.data["count"], 1)
+
     def test_retrieve(self):
         self.retrieve_request_factory(self.urls["detail_raw"], self.retrieve_cases)
 
@@ -273,6 +319,30 @@ class ProductViewsetTests(APITestCaseForChads):
         self.assertEqual(response["Content-Type"], "application/pdf")
         self.assertIn(self.expected_pdf_file_name, response["Content-Disposition"])
 
+    def test_action_price_get_etag(self):
+        self.authorize(self.superuser)
+        response = self.client.get(self.urls["price"])
+        etag = response["ETag"]
+        self.assertIn("private", response["Cache-Control"])
+        # Test unchanged price list is not rendered again
+        response = self.client.get(self.urls["price"], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        # Test changed product is rendered
+        self.product.price += 1
+        self.product.save()
+        response = self.client.get(self.urls["price"], HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_action_price_get_docx(self):
+        self.authorize(self.superuser)
+        self.company.price_template = self.company.PriceListTemplates.TEMPLATE_1_DOCX
+        self.company.save()
+        response = self.client.get(self.urls["price"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], DOCX_CONTENT_TYPE)
+        self.assertIn(self.expected_pdf_file_name.replace(".pdf", ".docx"), response["Content-Disposition"])
+
     def test_action_price_post(self):
         self.authorize(self.superuser)
         response = self.client.post(self.urls["price"])
@@ -296,3 +366,56 @@ class ProductViewsetTests(APITestCaseForChads):
         self.assertEqual(expected_name, document.name)
         self.assertIn(self.expected_pdf_file_name, str(document.url))
         self.assertEqual(self.expected_pdf_product, document.product)
+
+    def test_action_offer_post_docx(self):
+        self.authorize(self.superuser)
+        self.company.offer_template = self.company.CommercialOfferTemplates.TEMPLATE_1_DOCX
+        self.company.save()
+        response = self.client.post(self.urls["offer"], data={"name": "document name"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        document = Document.objects.get()
+        self.assertTrue(document.url.name.endswith(".docx"))
+
+    def test_action_offer_post_async(self):
+        self.authorize(self.superuser)
+        expected_name = "document name"
+        payload = {"name": expected_name, "pdf_blocks": [1, 2, 3]}
+        with self.settings(PRODUCT_OFFER_ASYNC=True, CELERY_TASK_ALWAYS_EAGER=True):
+            response = self.client.post(self.urls["offer"], data=payload)
+        # test response
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIn("task_id", response.data)
+        self.assertIn(reverse("api:task-detail", args=[response.data["task_id"]]), response.data["task_url"])
+        # test task is owned by request user
+        task_response = self.client.get(reverse("api:task-detail", args=[response.data["task_id"]]))
+        self.assertEqual(task_response.status_code, status.HTTP_200_OK)
+        # test document is created by task
+        document = Document.objects.get()
+        self.assertEqual(expected_name, document.name)
+        self.assertEqual(self.expected_pdf_product, document.product)
+
+    def test_action_offers_post(self):
+        self.authorize(self.superuser)
+        product = ProductFactory(company=self.company)
+        payload = {"name": "document name", "products": [self.product.id, product.id], "merge": False}
+        with self.settings(CELERY_TASK_ALWAYS_EAGER=True):
+            response = self.client.post(self.urls["offers"], data=payload)
+        # test response
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIn(reverse("api:task-detail", args=[response.data["task_id"]]), response.data["task_url"])
+        # test documents are created by task
+        self.assertEqual(
+            set(Document.objects.values_list("product", flat=True)), {self.product.id, product.id}
+        )
+
+    def test_action_offers_post_invalid(self):
+        self.authorize(self.superuser)
+        test_cases = [  # (products, info_msg)
+            ([], "Products are required"),
+            ([self.product.id, self.other_product.id], "Other company products are not found"),
+        ]
+        for products, info_msg in test_cases:
+            payload = {"name": "document name", "products": products}
+            response = self.client.post(self.urls["offers"], data=payload)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, info_msg)
+        self.assertFalse(Document.objects.exists())
@@ -1,31 +1,50 @@
 import django_filters
+from django.conf import settings
+from django.core.files.base import ContentFile
 from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response, patch_cache_control
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import DjangoModelPermissions, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
 from crm.api.documents.serializers import DocumentSerializer
-from crm.companies.selectors import User, pdf_block_list_filter_by_ids, product_list
-from crm.companies.services import document_create, product_translate
-from crm.core.pagination import PageNumberPagination
-from crm.core.utils import convert_img_to_base64, generate_qr_code, html_to_pdf
+from crm.companies.selectors import User, product_list
+from crm.companies.services import product_document_render, product_offer_create, product_pdf_context
+from crm.companies.tasks import product_offer_batch_task, product_offer_task
+from crm.core.pagination import KeysetPagination, PageNumberPagination
+from crm.core.utils import DOCX_CONTENT_TYPE, html_string_to_pdf, is_docx_template, pdf_cache_key
 
 from ..mixins import (
     BaseFilter,
     CreateInfoMixin,
     DeleteMultipleMixin,
     DeleteMultipleSerializer,
+    FileResponseMixin,
+    TaskResponseMixin,
+    TrigramSearchMixin,
     VectorSearchMixin,
 )
 from ..permissions import validate_product
-from .serializers import OfferSerializer, Product, ProductSerializer
+from .serializers import OfferBatchSerializer, OfferSerializer, Product, ProductSerializer
 
 
-class ProductViewset(VectorSearchMixin, CreateInfoMixin, DeleteMultipleMixin, ModelViewSet):
+class ProductViewset(
+    VectorSearchMixin,
+    TrigramSearchMixin,
+    CreateInfoMixin,
+    DeleteMultipleMixin,
+    FileResponseMixin,
+    TaskResponseMixin,
+    ModelViewSet,
+):
     class Pagination(PageNumberPagination):
         page_size = 10
+        count_strategy = "estimated"
+        keyset_pagination_class = KeysetPagination
 
     class Filter(BaseFilter):
         class Meta:
@@ -40,7 +59,9 @@ class ProductViewset(VectorSearchMixin, CreateInfoMixin, DeleteMultipleMixin, Mo
 
     def get_queryset(self):
         products = product_list(self.request.user)
-        products = self.search(products, search_fields=["data"])
+        if self.request.query_params.get("searchMode") == "trigram":
+            return self.trigram_search(products, ["name", "pid"])
+        products = self.search(products, vector_field="search_vector")
         return products
 
     def get_serializer_class(self):
@@ -54,6 +75,7 @@ class ProductViewset(VectorSearchMixin, CreateInfoMixin, DeleteMultipleMixin, Mo
             "add": list_serializer,
             "ids": DeleteMultipleSerializer,
             "offer": OfferSerializer,
+            "offers": OfferBatchSerializer,
         }
         return serializer_classes.get(self.action, list_serializer)
 
@@ -63,27 +85,39 @@ class ProductViewset(VectorSearchMixin, CreateInfoMixin, DeleteMultipleMixin, Mo
 
     def generate_pdf_context(self, user: User, product: Product, pdf_blocks: list[int] = []) -> dict:
         validate_product(product)
-        context = {
-            "user": user,
-            "company": product.company,
-            "product": product_translate(product=product),
-            "pdf_blocks": pdf_block_list_filter_by_ids(user, pdf_blocks),
-            "qr_code": convert_img_to_base64(generate_qr_code(product.url)),
-            "file_name": f"{user.username}-{product.id}.pdf",
-        }
-        return context
+        return product_pdf_context(user=user, product=product, pdf_blocks=pdf_blocks)
 
-    def generate_pdf_response(self, file, file_name, disposition="inline") -> HttpResponse:
-        response = HttpResponse(file, content_type="application/pdf")
-        response["Content-Disposition"] = f"{disposition}; filename={file_name}"
-        return response
+    def generate_pdf_response(self, file: bytes, file_name, disposition="inline", etag=None) -> HttpResponse:
+        return self.file_response(
+            ContentFile(file), file_name, etag=etag, disposition=disposition, content_type="application/pdf"
+        )
 
     @action(detail=True, methods=["get"])
     def price(self, request, pk=None):
+        """
+        Price list PDF is cached by the hash of its rendered html, which is also the ETag.
+        Repeated request with If-None-Match skips PDF rendering.
+        DOCX price list is cheap to render and is sent as attachment without caching.
+        """
         context = self.generate_pdf_context(request.user, self.get_object())
         template = context["company"].price_template
-        pdf_file = html_to_pdf(request, template, context)
-        response = self.generate_pdf_response(pdf_file, context["file_name"])
+        if is_docx_template(template):
+            content, file_name = product_document_render(template=template, context=context)
+            return self.file_response(
+                ContentFile(content), file_name, disposition="attachment", content_type=DOCX_CONTENT_TYPE
+            )
+
+        html = render_to_string(template, context)
+        base_url = request.build_absolute_uri()
+        cache_key = pdf_cache_key(html, base_url=base_url)
+        etag = f'W/"{cache_key}"'
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            pdf_file = html_string_to_pdf(html, base_url=base_url, cache_key=cache_key)
+            response = self.generate_pdf_response(pdf_file, context["file_name"], etag=etag)
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
         return response
 
     @action(detail=True, methods=["post"])
@@ -93,18 +127,46 @@ class ProductViewset(VectorSearchMixin, CreateInfoMixin, DeleteMultipleMixin, Mo
 
         instance_name = serializer.validated_data["name"]
         pdf_blocks = serializer.validated_data.get("pdf_blocks", [])
+        product = self.get_object()
+        validate_product(product)
 
-        context = self.generate_pdf_context(request.user, self.get_object(), pdf_blocks=pdf_blocks)
-        template = context["company"].offer_template
-        pdf_file = html_to_pdf(request, template, context, "css/pdf.css")
-
-        document = document_create(
-            document_data={
-                "pdf_file": {"content": pdf_file, "name": context["file_name"]},
-                "name": instance_name,
-                "product": context["product"],
-            }
+        if settings.PRODUCT_OFFER_ASYNC:
+            task_result = product_offer_task.delay(
+                request.user.pk, product.pk, instance_name, request.build_absolute_uri(), pdf_blocks
+            )
+            return self.task_response(task_result, status_code=status.HTTP_202_ACCEPTED)
+
+        document = product_offer_create(
+            user=request.user,
+            product=product,
+            name=instance_name,
+            base_url=request.build_absolute_uri(),
+            pdf_blocks=pdf_blocks,
         )
         document = DocumentSerializer(document, context={"request": request})
 
         return Response(document.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"])
+    def offers(self, request):
+        """Commercial offers of many products are rendered by celery task, one document per product or merged"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        product_pks = list(dict.fromkeys(serializer.validated_data["products"]))
+        products = product_list(request.user).filter(pk__in=product_pks)
+        not_found = set(product_pks) - {product.pk for product in products}
+        if not_found:
+            raise ValidationError({"products": f"Товары не найдены: {sorted(not_found)}"})
+        for product in products:
+            validate_product(product)
+
+        task_result = product_offer_batch_task.delay(
+            request.user.pk,
+            product_pks,
+            serializer.validated_data["name"],
+            request.build_absolute_uri(),
+            serializer.validated_data.get("pdf_blocks", []),
+            serializer.validated_data["merge"],
+        )
+        return self.task_response(task_result, status_code=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,7 @@
+from django.urls import resolve, reverse
+
+
+def test_task_detail():
+    task_id = "a2ce7d4c-6bb2-4c9e-9e77-0b8b3a4f8d2f"
+    assert reverse("api:task-detail", args=[task_id]) == f"/api/v1/tasks/{task_id}/"
+    assert resolve(f"/api/v1/tasks/{task_id}/").view_name == "api:task-detail"
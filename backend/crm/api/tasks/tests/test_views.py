@@ -0,0 +1,70 @@
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+
+from config import celery_app
+from crm.api.mixins import TASK_OWNER_CACHE_KEY
+from crm.api.utils import APITestCaseForChads
+from crm.core.utils import task_progress_advance, task_progress_start
+from crm.users.tests.factories import ManagerUserFactory, UserFactory
+
+
+class TaskViewsetTests(APITestCaseForChads):
+    def setUp(self):
+        super().setUp()
+        self.manager = ManagerUserFactory(**self.credentials)
+        self.url = reverse("api:task-detail", args=[uuid4()])
+
+    def test_retrieve(self):
+        test_cases = [  # (state, result, expected_response)
+            ("PENDING", None, {"status": "PENDING", "result": None}),
+            (
+                "PROGRESS",
+                {"current": 1, "total": 2},
+                {"status": "PROGRESS", "result": {"current": 1, "total": 2}},
+            ),
+            ("SUCCESS", {"document": 1}, {"status": "SUCCESS", "result": {"document": 1}}),
+            ("FAILURE", ValueError("broken"), {"status": "FAILURE", "error": "ValueError('broken')"}),
+        ]
+        self.authorize(self.manager)
+        for state, result, expected_response in test_cases:
+            task_id = str(uuid4())
+            cache.set(f"{TASK_OWNER_CACHE_KEY}:{task_id}", self.manager.pk)
+            if state != "PENDING":
+                celery_app.backend.store_result(task_id, result, state)
+            response = self.client.get(reverse("api:task-detail", args=[task_id]))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data, {"task_id": task_id, **expected_response}, state)
+            celery_app.backend.forget(task_id)
+
+    def test_retrieve_anonymous(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_retrieve_not_owner(self):
+        task_id = str(uuid4())
+        cache.set(f"{TASK_OWNER_CACHE_KEY}:{task_id}", UserFactory().pk)
+        celery_app.backend.store_result(task_id, {"document": 1}, "SUCCESS")
+        self.authorize(self.manager)
+        for url in (reverse("api:task-detail", args=[task_id]), self.url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        celery_app.backend.forget(task_id)
+
+    def test_retrieve_progress(self):
+        task_id = str(uuid4())
+        cache.set(f"{TASK_OWNER_CACHE_KEY}:{task_id}", self.manager.pk)
+        task_progress_start(task_id, total=2)
+        task_progress_advance(task_id, failed=True)
+        self.authorize(self.manager)
+        url = reverse("api:task-detail", args=[task_id])
+        response = self.client.get(url)
+        self.assertEqual(response.data["status"], "PROGRESS")
+        self.assertEqual(response.data["result"], {"current": 1, "total": 2, "failed": 1})
+        # test result is reported when task is finished
+        celery_app.backend.store_result(task_id, {"current": 2}, "SUCCESS")
+        response = self.client.get(url)
+        self.assertEqual(response.data, {"task_id": task_id, "status": "SUCCESS", "result": {"current": 2}})
+        celery_app.backend.forget(task_id)
@@ -0,0 +1,34 @@
+from celery.result import AsyncResult
+from django.core.cache import cache
+from django.http import Http404
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.viewsets import ViewSet
+
+from crm.core.utils import task_progress
+
+from ..mixins import TASK_OWNER_CACHE_KEY
+
+
+class TaskViewset(ViewSet):
+    """
+    Status of celery task started by API action, e.g. products/{id}/offer or company-links/{id}/parse.
+    Task is visible only to the user who started it.
+    Task fanned out to subtasks reports their aggregated progress until its result is ready.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def retrieve(self, request, pk=None):
+        if cache.get(f"{TASK_OWNER_CACHE_KEY}:{pk}") != request.user.pk:
+            raise Http404
+        task_result = AsyncResult(pk)
+        progress = None if task_result.ready() else task_progress(pk)
+        if progress is not None:
+            return Response({"task_id": task_result.id, "status": "PROGRESS", "result": progress})
+        response = {"task_id": task_result.id, "status": task_result.state}
+        if task_result.failed():
+            response["error"] = repr(task_result.result)
+        else:
+            response["result"] = task_result.info
+        return Response(response)
@@ -9,6 +9,7 @@ from .deals.views import DealViewset
 from .documents.views import DocumentViewset
 from .pdfblocks.views import PDFBlockViewset
 from .products.views import ProductViewset
+from .tasks.views import TaskViewset
 from .translations.views import ProductTranslationViewset
 from .users.views import UserViewset
 
@@ -29,6 +30,7 @@ router.register("customers", CustomerViewset)
 router.register("deals", DealViewset)
 router.register("pdf-blocks", PDFBlockViewset)
 router.register("documents", DocumentViewset)
+router.register("tasks", TaskViewset, basename="task")
 
 
 urlpatterns = router.urls
@@ -5,3 +5,9 @@ class CompaniesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "crm.companies"
     label = "companies"
+
+    def ready(self):
+        try:
+            import crm.companies.signals  # noqa: F401
+        except ImportError:
+            pass
@@ -0,0 +1,255 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator, Iterator
+from contextlib import asynccontextmanager, contextmanager
+from functools import cache
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class HostLimiter:
+    """Limit concurrent requests and request rate for a single host"""
+
+    def __init__(self, max_connections: int, min_interval: float):
+        self.semaphore = threading.BoundedSemaphore(max_connections)
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.next_request_at = 0.0
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        with self.semaphore:
+            with self.lock:
+                now = time.monotonic()
+                delay = self.next_request_at - now
+                self.next_request_at = max(now, self.next_request_at) + self.min_interval
+            if delay > 0:
+                time.sleep(delay)
+            yield
+
+
+class AsyncHostLimiter:
+    """asyncio counterpart of HostLimiter, must be used within a single event loop"""
+
+    def __init__(self, max_connections: int, min_interval: float):
+        self.semaphore = asyncio.Semaphore(max_connections)
+        self.min_interval = min_interval
+        self.next_request_at = 0.0
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self.semaphore:
+            now = time.monotonic()
+            delay = self.next_request_at - now
+            self.next_request_at = max(now, self.next_request_at) + self.min_interval
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield
+
+
+class BaseFeedClient:
+    """Retry policy shared by sync and async feed clients"""
+
+    def __init__(
+        self,
+        max_connections_per_host: int = 2,
+        min_interval: float = 0.0,
+        max_attempts: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+    ):
+        self.max_connections_per_host = max_connections_per_host
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def get_backoff(self, attempt: int, response: requests.Response | httpx.Response | None = None) -> float:
+        """Exponential backoff with jitter, Retry-After header of the response takes precedence"""
+        retry_after = response.headers.get("Retry-After", "") if response is not None else ""
+        if retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        backoff = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return random.uniform(backoff / 2, backoff)
+
+
+class FeedClient(BaseFeedClient):
+    """
+    HTTP client for product feeds, one per worker process.
+    Keep-alive connections are pooled in a single session,
+    requests are limited per host and retried with exponential backoff and jitter.
+    """
+
+    def __init__(self, *args, pool_maxsize: int = 10, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.limiters = defaultdict(lambda: HostLimiter(self.max_connections_per_host, self.min_interval))
+        self.limiters_lock = threading.Lock()
+
+    def get_limiter(self, url: str) -> HostLimiter:
+        with self.limiters_lock:
+            return self.limiters[urlsplit(url).netloc]
+
+    @contextmanager
+    def open(
+        self, url: str, *, timeout: tuple[float, float], max_attempts: int = None, **kwargs
+    ) -> Iterator[requests.Response]:
+        """
+        Send GET request, yield response and hold the host slot until exit.
+        Connection errors, timeouts and RETRY_STATUS_CODES are retried [max_attempts] times,
+        then the last error is raised. Other error statuses raise HTTPError immediately.
+        Example:
+            with feed_client.open(url, timeout=(3, 30), stream=True) as response:
+                response.iter_content()
+        """
+        max_attempts = max_attempts or self.max_attempts
+        limiter = self.get_limiter(url)
+        for attempt in range(max_attempts):
+            is_last_attempt = attempt + 1 >= max_attempts
+            with limiter.slot():
+                try:
+                    response = self.session.get(url, timeout=timeout, **kwargs)
+                except (ConnectionError, Timeout):
+                    if is_last_attempt:
+                        raise
+                    response = None
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or is_last_attempt:
+                        with response:
+                            response.raise_for_status()
+                            yield response
+                        return
+                    response.close()
+            time.sleep(self.get_backoff(attempt, response))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Send GET request and read the whole response body"""
+        with self.open(url, **kwargs) as response:
+            response.content
+            return response
+
+
+class AsyncFeedClient(BaseFeedClient):
+    """
+    Download many product feeds concurrently by asyncio in a background thread of one worker process.
+    Feed request is a dict of key, url, headers and timeouts - (connect, read) seconds.
+    Same per-host limits and retry policy as FeedClient, at most [concurrency] downloads run at once.
+    """
+
+    def __init__(self, *args, concurrency: int = 10, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.concurrency = concurrency
+
+    async def get(
+        self, session: httpx.AsyncClient, limiter: AsyncHostLimiter, feed_request: dict
+    ) -> httpx.Response:
+        connect_timeout, read_timeout = feed_request["timeouts"]
+        timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        for attempt in range(self.max_attempts):
+            is_last_attempt = attempt + 1 >= self.max_attempts
+            async with limiter.slot():
+                try:
+                    response = await session.get(
+                        feed_request["url"], headers=feed_request.get("headers"), timeout=timeout
+                    )
+                except httpx.TransportError:
+                    if is_last_attempt:
+                        raise
+                    response = None
+                else:
+                    if response.status_code not in RETRY_STATUS_CODES or is_last_attempt:
+                        if response.status_code != httpx.codes.NOT_MODIFIED:
+                            response.raise_for_status()
+                        return response
+            await asyncio.sleep(self.get_backoff(attempt, response))
+
+    async def fetch_all(self, feed_requests: list[dict], results: queue.Queue, stop: threading.Event):
+        """Put (key, response or exception) to [results] as downloads complete"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limiters = defaultdict(lambda: AsyncHostLimiter(self.max_connections_per_host, self.min_interval))
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+
+        async def fetch(session: httpx.AsyncClient, feed_request: dict):
+            async with semaphore:
+                if stop.is_set():
+                    return
+                limiter = limiters[urlsplit(feed_request["url"]).netloc]
+                try:
+                    result = await self.get(session, limiter, feed_request)
+                except (httpx.HTTPError, httpx.InvalidURL) as e:
+                    result = e
+            # Blocks while consumer is busy, without blocking the event loop
+            await asyncio.to_thread(results.put, (feed_request["key"], result))
+
+        async with httpx.AsyncClient(limits=limits) as session:
+            await asyncio.gather(*(fetch(session, feed_request) for feed_request in feed_requests))
+
+    def iter_feeds(self, feed_requests: list[dict]) -> Iterator[tuple]:
+        """
+        Yield (key, response or httpx.HTTPError) of [feed_requests] in order of completion.
+        Completed downloads wait in a bounded queue, so fetching pauses while consumer saves products.
+        Example:
+            for key, response in AsyncFeedClient(concurrency=8).iter_feeds(feed_requests):
+                save(key, response)
+        """
+        results = queue.Queue(maxsize=self.concurrency)
+        stop = threading.Event()
+        done = object()
+        errors = []
+
+        def run():
+            try:
+                asyncio.run(self.fetch_all(feed_requests, results, stop))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                results.put(done)
+
+        thread = threading.Thread(target=run, name="feed-fetcher", daemon=True)
+        thread.start()
+        try:
+            while (item := results.get()) is not done:
+                yield item
+        finally:
+            # Unblock fetcher if consumer stopped early
+            stop.set()
+            while item is not done:
+                item = results.get()
+            thread.join()
+        if errors:
+            raise errors[0]
+
+
+@cache
+def get_feed_client() -> FeedClient:
+    """Process-wide FeedClient configured by FEED_CLIENT_* settings"""
+    return FeedClient(**get_feed_client_settings())
+
+
+def get_feed_client_settings() -> dict:
+    return {
+        "max_connections_per_host": settings.FEED_CLIENT_MAX_CONNECTIONS_PER_HOST,
+        "min_interval": settings.FEED_CLIENT_MIN_INTERVAL,
+        "max_attempts": settings.FEED_CLIENT_MAX_ATTEMPTS,
+        "backoff_base": settings.FEED_CLIENT_BACKOFF_BASE,
+        "backoff_max": settings.FEED_CLIENT_BACKOFF_MAX,
+    }
+
+
+# Connection pools must not be shared between forked worker processes
+os.register_at_fork(after_in_child=get_feed_client.cache_clear)
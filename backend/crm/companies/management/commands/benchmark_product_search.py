@@ -0,0 +1,67 @@
+import statistics
+import time
+from collections.abc import Callable
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, TextField
+from django.db.models.functions import Cast
+
+from crm.companies.models import Product
+
+
+class Command(BaseCommand):
+    help = "Benchmark product search by vector built for every row against the stored GIN-indexed vector"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--query", help="Search query, name of the first product by default")
+        parser.add_argument("--runs", type=int, default=20, help="Number of searches per mode")
+        parser.add_argument("--page-size", type=int, default=10)
+
+    def handle(self, *args, **options):
+        query = options["query"]
+        if not query:
+            product = Product.objects.first()
+            if product is None:
+                raise CommandError("Product not found")
+            query = product.name.split()[0]
+        search_query = SearchQuery(query)
+        page_size = options["page_size"]
+
+        def search_built():
+            search_vector = SearchVector(Cast("data_translated", output_field=TextField()))
+            products = (
+                Product.objects.annotate(search=search_vector, rank=SearchRank(search_vector, search_query))
+                .filter(search=search_query)
+                .order_by("-rank")
+            )
+            return products.count(), list(products.values_list("id", flat=True)[:page_size])
+
+        def search_stored():
+            products = (
+                Product.objects.filter(search_vector=search_query)
+                .annotate(rank=SearchRank(F("search_vector"), search_query))
+                .order_by("-rank")
+            )
+            return products.count(), list(products.values_list("id", flat=True)[:page_size])
+
+        self.stdout.write(f"query={query!r} products={Product.objects.count()}")
+        for name, search in [("built", search_built), ("stored", search_stored)]:
+            durations, found = self.measure(search, options["runs"])
+            self.report(name, durations, found)
+
+    def measure(self, search: Callable[[], tuple], runs: int) -> tuple[list[float], int]:
+        found, _ = search()  # warm up, the first search of every mode is excluded
+        durations = []
+        for _ in range(runs):
+            started_at = time.perf_counter()
+            search()
+            durations.append((time.perf_counter() - started_at) * 1000)
+        return durations, found
+
+    def report(self, name: str, durations: list[float], found: int):
+        p95 = statistics.quantiles(durations, n=20)[-1] if len(durations) > 1 else durations[0]
+        self.stdout.write(
+            f"{name}: runs={len(durations)} found={found} mean={statistics.mean(durations):.1f}ms "
+            f"median={statistics.median(durations):.1f}ms p95={p95:.1f}ms"
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from crm.companies.models import Product
+from crm.companies.services import product_search_vector
+from crm.core.utils import chunked
+
+
+class Command(BaseCommand):
+    help = "Fill stored search vector of products, rows without it by default"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Rebuild vectors of all products")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        products = Product.objects.only("id", "name", "pid", "data_translated").order_by("id")
+        if not options["all"]:
+            products = products.filter(search_vector__isnull=True)
+
+        updated = 0
+        for batch in chunked(products.iterator(chunk_size=options["batch_size"]), options["batch_size"]):
+            for product in batch:
+                product.search_vector = product_search_vector(
+                    name=product.name, pid=product.pid, data_translated=product.data_translated
+                )
+            updated += Product.objects.bulk_update(batch, fields=["search_vector"])
+        self.stdout.write(f"Updated product search vectors: {updated}")
@@ -0,0 +1,15 @@
+from .selectors import tenant_context
+
+
+class TenantContextMiddleware:
+    """Company ids of request users are resolved once per request, see user_get_company_ids"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = tenant_context.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            tenant_context.reset(token)
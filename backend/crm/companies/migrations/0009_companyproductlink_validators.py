@@ -0,0 +1,27 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies", "0008_product_companies_p_pid_e12c22_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="companyproductlink",
+            name="content_hash",
+            field=models.CharField(blank=True, max_length=64, verbose_name="Хеш содержимого"),
+        ),
+        migrations.AddField(
+            model_name="companyproductlink",
+            name="etag",
+            field=models.CharField(blank=True, max_length=255, verbose_name="ETag"),
+        ),
+        migrations.AddField(
+            model_name="companyproductlink",
+            name="last_modified",
+            field=models.CharField(blank=True, max_length=64, verbose_name="Last-Modified"),
+        ),
+    ]
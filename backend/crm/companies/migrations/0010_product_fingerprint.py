@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies", "0009_companyproductlink_validators"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="fingerprint",
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name="Отпечаток"),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:00
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies", "0010_product_fingerprint"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="companyproductlink",
+            name="connect_timeout",
+            field=models.FloatField(
+                default=3,
+                validators=[django.core.validators.MinValueValidator(0.1)],
+                verbose_name="Таймаут подключения, с",
+            ),
+        ),
+        migrations.AddField(
+            model_name="companyproductlink",
+            name="read_timeout",
+            field=models.FloatField(
+                default=30,
+                validators=[django.core.validators.MinValueValidator(0.1)],
+                verbose_name="Таймаут чтения, с",
+            ),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:14
+
+from django.db import migrations, models
+
+
+def translate_products(apps, schema_editor):
+    Product = apps.get_model("companies", "Product")
+    ProductTranslation = apps.get_model("companies", "ProductTranslation")
+    translations = dict(ProductTranslation.objects.values_list("key", "value"))
+    products = []
+    for product in Product.objects.only("id", "data").iterator(chunk_size=500):
+        if isinstance(product.data, dict):
+            product.data_translated = {translations.get(key, key): value for key, value in product.data.items()}
+        else:
+            product.data_translated = product.data
+        products.append(product)
+        if len(products) >= 500:
+            Product.objects.bulk_update(products, ["data_translated"])
+            products = []
+    Product.objects.bulk_update(products, ["data_translated"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies", "0011_companyproductlink_timeouts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="data_translated",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="Параметры с переводом"
+            ),
+        ),
+        migrations.RunPython(translate_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies", "0012_product_data_translated"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="company",
+            name="offer_template",
+            field=models.CharField(
+                choices=[
+                    ("commercial-offers/1.html", "Шаблон коммерческого предложения #1"),
+                    ("commercial-offers/1.docx", "Шаблон коммерческого предложения #1 (DOCX)"),
+                ],
+                default="commercial-offers/1.html",
+                max_length=150,
+                verbose_name="Шаблон для коммерческого предложения",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="company",
+            name="price_template",
+            field=models.CharField(
+                choices=[
+                    ("price-lists/1.html", "Шаблон прайс-листа #1"),
+                    ("price-lists/1.docx", "Шаблон прайс-листа #1 (DOCX)"),
+                ],
+                default="price-lists/1.html",
+                max_length=150,
+                verbose_name="Шаблон для прайс-листа",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies", "0015_trigram_search"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="deal",
+            index=models.Index(fields=["created_at", "id"], name="companies_d_created_cdcdfb_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(fields=["created_at", "id"], name="companies_p_created_f06772_idx"),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.3 on 2026-10-18 21:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def deal_company_backfill(apps, schema_editor):
+    Deal = apps.get_model("companies", "Deal")
+    Product = apps.get_model("companies", "Product")
+    product_company = Product.objects.filter(pk=models.OuterRef("product_id")).values("company_id")[:1]
+    Deal.objects.update(company_id=models.Subquery(product_company))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies", "0016_created_at_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deal",
+            name="company",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="deals",
+                to="companies.company",
+                verbose_name="Компания",
+            ),
+        ),
+        migrations.RunPython(deal_company_backfill, migrations.RunPython.noop),
+    ]
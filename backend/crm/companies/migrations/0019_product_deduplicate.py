@@ -0,0 +1,42 @@
+# Generated by Django 4.2.3 on 2026-10-18 22:10
+
+from uuid import uuid4
+
+from django.db import migrations, models
+
+
+def product_deduplicate(apps, schema_editor):
+    Product = apps.get_model("companies", "Product")
+    Deal = apps.get_model("companies", "Deal")
+    Document = apps.get_model("documents", "Document")
+    # manually created products have no feed id
+    for product in Product.objects.filter(pid="").only("id").iterator(chunk_size=500):
+        product.pid = str(uuid4())
+        product.save(update_fields=["pid"])
+    # the oldest product of duplicated pid is kept, related rows of the others are moved to it
+    duplicates = (
+        Product.objects.order_by()
+        .values("company_id", "pid")
+        .annotate(count=models.Count("id"), keep_id=models.Min("id"))
+        .filter(count__gt=1)
+    )
+    for duplicate in list(duplicates):
+        product_ids = list(
+            Product.objects.filter(company_id=duplicate["company_id"], pid=duplicate["pid"])
+            .exclude(id=duplicate["keep_id"])
+            .values_list("id", flat=True)
+        )
+        Deal.objects.filter(product_id__in=product_ids).update(product_id=duplicate["keep_id"])
+        Document.objects.filter(product_id__in=product_ids).update(product_id=duplicate["keep_id"])
+        Product.objects.filter(id__in=product_ids).delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies", "0018_alter_deal_company"),
+        ("documents", "0007_alter_document_company"),
+    ]
+
+    operations = [
+        migrations.RunPython(product_deduplicate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # separate from the deduplication, postgres can't alter the table with pending deferred constraint checks
+    dependencies = [
+        ("companies", "0019_product_deduplicate"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.UniqueConstraint(fields=("company", "pid"), name="product_company_pid_unique"),
+        ),
+    ]
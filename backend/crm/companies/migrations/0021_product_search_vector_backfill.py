@@ -0,0 +1,47 @@
+# Generated by Django 4.2.3 on 2026-10-18 22:25
+
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+
+def product_search_vector(*, name: str, pid: str, data_translated) -> SearchVector:
+    # Frozen copy of crm.companies.services.product_search_vector
+    if isinstance(data_translated, dict):
+        keys, values = " ".join(map(str, data_translated)), " ".join(map(str, data_translated.values()))
+    else:
+        keys, values = "", str(data_translated)
+    return (
+        SearchVector(Value(name), weight="A")
+        + SearchVector(Value(str(pid)), weight="A")
+        + SearchVector(Value(values), weight="B")
+        + SearchVector(Value(keys), weight="C")
+    )
+
+
+def product_search_vector_backfill(apps, schema_editor):
+    Product = apps.get_model("companies", "Product")
+    products = []
+    for product in (
+        Product.objects.filter(search_vector__isnull=True)
+        .only("id", "name", "pid", "data_translated")
+        .iterator(chunk_size=500)
+    ):
+        product.search_vector = product_search_vector(
+            name=product.name, pid=product.pid, data_translated=product.data_translated
+        )
+        products.append(product)
+        if len(products) >= 500:
+            Product.objects.bulk_update(products, ["search_vector"])
+            products = []
+    Product.objects.bulk_update(products, ["search_vector"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies", "0020_product_company_pid_unique"),
+    ]
+
+    operations = [
+        migrations.RunPython(product_search_vector_backfill, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,12 @@
+from uuid import uuid4
+
 from ckeditor.fields import RichTextField
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils.translation import gettext_lazy as _
 from model_utils import FieldTracker
 
@@ -29,9 +35,11 @@ class Company(BaseModel):
 
     class PriceListTemplates(models.TextChoices):
         TEMPLATE_1 = "price-lists/1.html", "Шаблон прайс-листа #1"
+        TEMPLATE_1_DOCX = "price-lists/1.docx", "Шаблон прайс-листа #1 (DOCX)"
 
     class CommercialOfferTemplates(models.TextChoices):
         TEMPLATE_1 = "commercial-offers/1.html", "Шаблон коммерческого предложения #1"
+        TEMPLATE_1_DOCX = "commercial-offers/1.docx", "Шаблон коммерческого предложения #1 (DOCX)"
 
     company_type = models.ForeignKey(
         CompanyType, on_delete=models.SET_NULL, null=True, verbose_name=_("Тип Компании")
@@ -89,21 +97,40 @@ class CompanyProductLink(BaseModel):
     name = models.CharField(_("Название"), max_length=150)
     url = models.URLField(_("Ссылка"))
     is_valid = models.BooleanField(_("Функционирующий"), default=True)
+    connect_timeout = models.FloatField(
+        _("Таймаут подключения, с"), default=3, validators=[MinValueValidator(0.1)]
+    )
+    read_timeout = models.FloatField(_("Таймаут чтения, с"), default=30, validators=[MinValueValidator(0.1)])
+    # validators of the last successful integration
+    etag = models.CharField(_("ETag"), max_length=255, blank=True)
+    last_modified = models.CharField(_("Last-Modified"), max_length=64, blank=True)
+    content_hash = models.CharField(_("Хеш содержимого"), max_length=64, blank=True)
     # tracker
     tracker = FieldTracker()
 
     def __str__(self):
         return f"{self.company} - {self.name} - {self.url}"
 
+    @property
+    def timeouts(self) -> tuple[float, float]:
+        return (self.connect_timeout, self.read_timeout)
+
     def save(self, *args, **kwargs):
         if self.url != self.tracker.previous("url"):
             self.is_valid = True
+            self.etag = self.last_modified = self.content_hash = ""
         super().save(*args, **kwargs)
 
 
 class Customer(BaseUser):
     class Meta:
         verbose_name_plural = "Customers"
+        indexes = [
+            # typeahead search
+            GinIndex(OpClass(Upper("first_name"), name="gin_trgm_ops"), name="customer_first_name_trgm"),
+            GinIndex(OpClass(Upper("last_name"), name="gin_trgm_ops"), name="customer_last_name_trgm"),
+            GinIndex(OpClass(Upper("phone_number"), name="gin_trgm_ops"), name="customer_phone_number_trgm"),
+        ]
 
     company = models.ForeignKey(
         Company, on_delete=models.CASCADE, related_name="customers", verbose_name=_("Компания")
@@ -118,6 +145,15 @@ class Product(BaseModel):
         verbose_name_plural = "Products"
         indexes = [
             models.Index(fields=["pid"]),
+            models.Index(fields=["created_at", "id"]),
+            GinIndex(fields=["search_vector"]),
+            # typeahead search
+            GinIndex(OpClass(Upper("name"), name="gin_trgm_ops"), name="product_name_trgm"),
+            GinIndex(OpClass(Upper("pid"), name="gin_trgm_ops"), name="product_pid_trgm"),
+        ]
+        constraints = [
+            # integration upserts products by feed id
+            models.UniqueConstraint(fields=["company", "pid"], name="product_company_pid_unique"),
         ]
 
     company = models.ForeignKey(
@@ -132,10 +168,43 @@ class Product(BaseModel):
     price_special = models.PositiveIntegerField(_("Цена специальная"), null=True, blank=True)
     url = models.URLField(_("Ссылка"))
     is_active = models.BooleanField(_("Активен"), default=True)
+    # data with keys translated by ProductTranslation
+    data_translated = models.JSONField(_("Параметры с переводом"), default=dict, blank=True, editable=False)
+    # hash of the feed item from the last integration
+    fingerprint = models.CharField(_("Отпечаток"), max_length=64, blank=True, editable=False)
+    # weighted full text search document of name, pid and translated data
+    search_vector = SearchVectorField(_("Поисковый вектор"), null=True, editable=False)
 
     def __str__(self):
         return f"{self.company.name} - {self.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # company as loaded, FieldTracker would query deferred fields of partially loaded products
+        instance._loaded_company_id = instance.__dict__.get("company_id")
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .services import product_search_vector, product_translation_map, translate_dict_keys
+
+        # Manually created product has no feed id
+        if not self.pid:
+            self.pid = str(uuid4())
+        # Manual changes must be overwritten by the next integration
+        self.fingerprint = ""
+        self.data_translated = translate_dict_keys(data=self.data, translations=product_translation_map())
+        self.search_vector = product_search_vector(
+            name=self.name, pid=self.pid, data_translated=self.data_translated
+        )
+        loaded_company_id = getattr(self, "_loaded_company_id", None)
+        super().save(*args, **kwargs)
+        if loaded_company_id is not None and loaded_company_id != self.company_id:
+            # denormalized company of related rows
+            self.deals.update(company_id=self.company_id)
+            self.document_set.update(company_id=self.company_id)
+        self._loaded_company_id = self.company_id
+
 
 class ProductImage(BaseModel):
     class Meta:
@@ -157,6 +226,8 @@ class ProductTranslation(BaseModel):
 
     key = models.CharField(_("Ключ"), max_length=70)
     value = models.CharField(_("Значение"), max_length=70)
+    # tracker
+    tracker = FieldTracker()
 
     def __str__(self):
         return f"{self.key} - {self.value}"
@@ -165,6 +236,9 @@ class ProductTranslation(BaseModel):
 class Deal(BaseModel):
     class Meta:
         verbose_name_plural = "Deals"
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+        ]
 
     manager = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, related_name="deals", verbose_name=_("Менеджер")
@@ -175,6 +249,14 @@ class Deal(BaseModel):
     product = models.ForeignKey(
         Product, on_delete=models.CASCADE, related_name="deals", verbose_name=_("Товар")
     )
+    # company of the product, so deals are filtered by company without join
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name="deals", editable=False, verbose_name=_("Компания")
+    )
 
     def __str__(self):
         return f"{self.customer} - {self.product}"
+
+    def save(self, *args, **kwargs):
+        self.company_id = self.product.company_id
+        super().save(*args, **kwargs)
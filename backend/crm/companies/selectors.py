@@ -1,17 +1,44 @@
+from contextvars import ContextVar
+from uuid import uuid4
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.db.models import Q
 from django.db.models.query import QuerySet
 
 from crm.documents.models import Document, PDFBlock
 
-from .models import Company, CompanyProductLink, CompanyType, Customer, Deal, Product
+from .models import Company, CompanyProductLink, CompanyType, Customer, Deal, Product, ProductTranslation
 
 User = get_user_model()
 
-
-def user_get_company_ids(user: User) -> QuerySet[int]:
-    """Return a queryset of company IDs that the user is a member of."""
-    return user.memberships.values_list("company_id", flat=True)
+PRODUCT_TRANSLATION_MAP_CACHE_KEY = "product_translation_map"
+PRODUCT_TRANSLATION_MAP_CACHE_TIMEOUT = 60 * 60 * 24
+USER_COMPANY_IDS_CACHE_KEY = "user_company_ids"
+USER_COMPANY_IDS_CACHE_TIMEOUT = 60 * 60 * 24
+# (version, map) loaded by this process
+_product_translation_map = (None, {})
+# {user_pk: company ids} resolved during the current request, set by TenantContextMiddleware
+tenant_context: ContextVar[dict | None] = ContextVar("tenant_context", default=None)
+
+
+def user_get_company_ids(user: User) -> list[int]:
+    """
+    Return a list of company IDs that the user is a member of.
+    IDs are resolved once per request and kept in the cache until memberships of the user change.
+    """
+    context = tenant_context.get()
+    if context is not None and user.pk in context:
+        return context[user.pk]
+
+    cache_key = f"{USER_COMPANY_IDS_CACHE_KEY}:{user.pk}"
+    company_ids = cache.get(cache_key)
+    if company_ids is None:
+        company_ids = list(user.memberships.values_list("company_id", flat=True))
+        cache.set(cache_key, company_ids, timeout=USER_COMPANY_IDS_CACHE_TIMEOUT)
+    if context is not None:
+        context[user.pk] = company_ids
+    return company_ids
 
 
 def user_list(user: User) -> QuerySet[User]:
@@ -24,7 +51,7 @@ def user_list(user: User) -> QuerySet[User]:
 def pdf_block_list(user: User) -> QuerySet[PDFBlock]:
     """Return a queryset of PDF blocks associated with the companies the user is a member of."""
     company_ids = user_get_company_ids(user)
-    pdf_blocks = PDFBlock.objects.filter(company__in=company_ids)
+    pdf_blocks = PDFBlock.objects.filter(company_id__in=company_ids)
     return pdf_blocks
 
 
@@ -37,7 +64,7 @@ def pdf_block_list_filter_by_ids(user: User, ids: list[int]):
 def document_list(user: User) -> QuerySet[Document]:
     """Return a queryset of documents associated with companies that the user is a member of."""
     company_ids = user_get_company_ids(user)
-    documents = Document.objects.filter(product__company__in=company_ids)
+    documents = Document.objects.filter(company_id__in=company_ids)
     return documents
 
 
@@ -58,28 +85,52 @@ def company_type_list(user: User) -> QuerySet[CompanyType]:
 def company_product_link_list(user: User) -> QuerySet[CompanyProductLink]:
     """Return a queryset of links for product parsing for companies that the user is a member of."""
     company_ids = user_get_company_ids(user)
-    company_product_links = CompanyProductLink.objects.filter(company__in=company_ids)
+    company_product_links = CompanyProductLink.objects.filter(company_id__in=company_ids)
     return company_product_links
 
 
 def customer_list(user: User) -> QuerySet[Customer]:
     """Return a queryset of customers associated with companies that the user is a member of."""
     company_ids = user_get_company_ids(user)
-    customers = Customer.objects.filter(company__in=company_ids)
+    customers = Customer.objects.filter(company_id__in=company_ids)
     return customers
 
 
 def product_list(user: User) -> QuerySet[Product]:
     """Return a queryset of products associated with companies that the user is a member of."""
     company_ids = user_get_company_ids(user)
-    products = Product.objects.filter(company__in=company_ids).prefetch_related("images")
+    products = Product.objects.filter(company_id__in=company_ids).prefetch_related("images")
     return products
 
 
 def deal_list(user: User) -> QuerySet[Company]:
     """Return a queryset of deals associated with company products that the user is a member of."""
     company_ids = user_get_company_ids(user)
-    deals = Deal.objects.filter(product__company__in=company_ids).select_related(
-        "manager", "product__company"
-    )
+    deals = Deal.objects.filter(company_id__in=company_ids).select_related("manager")
     return deals
+
+
+def product_translation_map() -> dict[str, str]:
+    """
+    Return a dict of all product translations {key: value}, must not be modified.
+    Map is kept in this process and in the cache under a version, that is bumped on every ProductTranslation change,
+    so while translations are unchanged it costs a single cache lookup and no queries.
+    """
+    global _product_translation_map
+
+    version_key = f"{PRODUCT_TRANSLATION_MAP_CACHE_KEY}:version"
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid4().hex, timeout=None)
+        version = cache.get(version_key)
+    if version is None:  # cache is unavailable
+        return dict(ProductTranslation.objects.values_list("key", "value"))
+
+    if version != _product_translation_map[0]:
+        map_key = f"{PRODUCT_TRANSLATION_MAP_CACHE_KEY}:{version}"
+        translations = cache.get(map_key)
+        if translations is None:
+            translations = dict(ProductTranslation.objects.values_list("key", "value"))
+            cache.set(map_key, translations, timeout=PRODUCT_TRANSLATION_MAP_CACHE_TIMEOUT)
+        _product_translation_map = (version, translations)
+    return _product_translation_map[1]
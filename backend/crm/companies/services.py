@@ -1,16 +1,60 @@
+import hashlib
+import json
+from collections import defaultdict
+from collections.abc import Iterator
+from functools import partial
+from pathlib import PurePath
+from tempfile import SpooledTemporaryFile
+from typing import Any
+from uuid import uuid4
+
+import httpx
 import requests
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVector
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 from django.db import transaction
+from django.db.models import Value
 from django.db.models.query import QuerySet
-from requests.exceptions import ConnectionError, HTTPError, InvalidJSONError, JSONDecodeError
-
+from django.template.loader import get_template
+from requests.exceptions import RequestException
+
+from crm.core.utils import (
+    DocxImage,
+    chunked,
+    data_uri_to_bytes,
+    find_static,
+    get_docx_renderer,
+    get_pdf_renderer,
+    html_to_pdf,
+    html_to_text,
+    is_docx_template,
+    iter_json_array,
+    qr_code_data_uri,
+    qr_codes_precompute,
+    render_docx,
+)
 from crm.documents.models import Document
 
+from .clients import get_feed_client
 from .models import Company, CompanyMember, CompanyProductLink, Product, ProductImage, ProductTranslation
+from .selectors import (
+    PRODUCT_TRANSLATION_MAP_CACHE_KEY,
+    USER_COMPANY_IDS_CACHE_KEY,
+    pdf_block_list_filter_by_ids,
+    product_translation_map,
+    tenant_context,
+)
 
 User = get_user_model()
 
+PRODUCT_BULK_BATCH_SIZE = 500
+PRODUCT_FINGERPRINT_FIELDS = ["name", "price", "price_special", "url", "data", "data_options", "images"]
+FEED_STREAM_CHUNK_SIZE = 64 * 1024
+FEED_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
 
 def document_create(*, document_data: dict) -> Document:
     """
@@ -29,6 +73,87 @@ def document_create(*, document_data: dict) -> Document:
     return document
 
 
+def product_pdf_contexts(*, user: User, products: list[Product], pdf_blocks: list[int] = None) -> list[dict]:
+    """
+    Contexts of the price list and commercial offer templates for many products.
+    PDF blocks are fetched once and shared, products must be fetched with their companies.
+    """
+    pdf_blocks = list(pdf_block_list_filter_by_ids(user, pdf_blocks or []))
+    return [
+        {
+            "user": user,
+            "company": product.company,
+            "product": product,
+            "pdf_blocks": pdf_blocks,
+            "qr_code": qr_code_data_uri(product.url),
+            "file_name": f"{user.username}-{product.id}.pdf",
+        }
+        for product in products
+    ]
+
+
+def product_pdf_context(*, user: User, product: Product, pdf_blocks: list[int] = None) -> dict:
+    """Context of the product price list and commercial offer templates"""
+    return product_pdf_contexts(user=user, products=[product], pdf_blocks=pdf_blocks)[0]
+
+
+def document_templates_warm_up() -> list[str]:
+    """
+    Compile document templates of all companies and parse PDF stylesheet before the first render,
+    called at web and celery worker start. Return warmed up templates.
+    PDF renderer is thread-local, so only the renderer of the calling thread is warmed up:
+    threads of gthread or threaded workers still parse the stylesheet on their first render.
+    Missing stylesheet is skipped.
+    """
+    templates = [*Company.PriceListTemplates.values, *Company.CommercialOfferTemplates.values]
+    for template in templates:
+        if is_docx_template(template):
+            get_docx_renderer().get_template(template)
+        else:
+            get_template(template)
+    stylesheet = find_static("css/pdf.css")
+    if stylesheet is not None:
+        get_pdf_renderer().get_stylesheet(stylesheet)
+    return templates
+
+
+def product_docx_context(*, context: dict) -> dict:
+    """DOCX counterpart of the product PDF context: QR code is an inline image, PDF blocks text is plain"""
+    return {
+        **context,
+        "qr_code": DocxImage(data_uri_to_bytes(context["qr_code"]), width_mm=30),
+        "pdf_blocks": [
+            {"name": pdf_block.name, "text": html_to_text(pdf_block.text_html)}
+            for pdf_block in context["pdf_blocks"]
+        ],
+    }
+
+
+def product_document_render(*, template: str, context: dict, base_url: str = None) -> tuple[bytes, str]:
+    """Render price list or commercial offer [template] to PDF or DOCX, return content and file name"""
+    if is_docx_template(template):
+        content = render_docx(template, product_docx_context(context=context))
+        return content, str(PurePath(context["file_name"]).with_suffix(".docx"))
+    return html_to_pdf(None, template, context, "css/pdf.css", base_url=base_url), context["file_name"]
+
+
+def product_offer_create(
+    *, user: User, product: Product, name: str, base_url: str, pdf_blocks: list[int] = None
+) -> Document:
+    """Render commercial offer of the product and save it as a document"""
+    context = product_pdf_context(user=user, product=product, pdf_blocks=pdf_blocks)
+    content, file_name = product_document_render(
+        template=context["company"].offer_template, context=context, base_url=base_url
+    )
+    return document_create(
+        document_data={
+            "pdf_file": {"content": content, "name": file_name},
+            "name": name,
+            "product": product,
+        }
+    )
+
+
 @transaction.atomic
 def user_create(*, user_data: dict) -> User:
     """Atomic transaction. Create user and associated company membership"""
@@ -62,24 +187,83 @@ def company_render_business_card(*, user: User, bc: str) -> str:
     return rendered_card
 
 
+def user_company_ids_invalidate(*, user_id: int):
+    """Drop company ids of the user resolved by user_get_company_ids now and once more after commit"""
+
+    def delete():
+        cache.delete(f"{USER_COMPANY_IDS_CACHE_KEY}:{user_id}")
+
+    context = tenant_context.get()
+    if context is not None:
+        context.pop(user_id, None)
+    delete()
+    # other processes could cache the old ids before commit
+    transaction.on_commit(delete)
+
+
 def product_translation_filter_by_keys(*, keys: list[str]) -> QuerySet[ProductTranslation]:
     return ProductTranslation.objects.filter(key__in=keys)
 
 
-def translate_dict_keys(
-    *, data: dict[str, str], translations: QuerySet[ProductTranslation]
-) -> dict[str, str]:
-    for trans in translations:
-        old_key = trans.key
-        new_key = trans.value
-        if old_key in data:
-            data[new_key] = data.pop(old_key)
-    return data
+def product_translation_map_invalidate():
+    """Bump version of the cached product_translation_map now and once more after commit"""
+
+    def bump_version():
+        cache.set(f"{PRODUCT_TRANSLATION_MAP_CACHE_KEY}:version", uuid4().hex, timeout=None)
+
+    bump_version()
+    # other processes could reload the old map before commit
+    transaction.on_commit(bump_version)
+
+
+def translate_dict_keys(*, data: dict | Any, translations: dict[str, str]) -> dict | Any:
+    """Return a copy of [data] with keys replaced by [translations], data other than dict is returned as is"""
+    if not isinstance(data, dict):
+        return data
+    return {translations.get(key, key): value for key, value in data.items()}
+
+
+def product_search_vector(*, name: str, pid: str, data_translated: dict | Any) -> SearchVector:
+    """
+    Search vector of product fields, saved by insert or update without reading the row.
+    Weights: A - name and pid, B - data values, C - translated data keys.
+    """
+    if isinstance(data_translated, dict):
+        keys, values = " ".join(map(str, data_translated)), " ".join(map(str, data_translated.values()))
+    else:
+        keys, values = "", str(data_translated)
+    return (
+        SearchVector(Value(name), weight="A")
+        + SearchVector(Value(str(pid)), weight="A")
+        + SearchVector(Value(values), weight="B")
+        + SearchVector(Value(keys), weight="C")
+    )
+
+
+def product_bulk_retranslate(*, keys: list[str], batch_size: int = PRODUCT_BULK_BATCH_SIZE) -> int:
+    """Refresh Product.data_translated of products with any of [keys] in data, return number of updated"""
+    translations = product_translation_map()
+    products = Product.objects.filter(data__has_any_keys=keys).only(
+        "id", "name", "pid", "data", "data_translated"
+    )
+    updated = 0
+    for products_batch in chunked(products.iterator(chunk_size=batch_size), batch_size):
+        products_to_update = []
+        for product in products_batch:
+            data_translated = translate_dict_keys(data=product.data, translations=translations)
+            if data_translated != product.data_translated:
+                product.data_translated = data_translated
+                product.search_vector = product_search_vector(
+                    name=product.name, pid=product.pid, data_translated=data_translated
+                )
+                products_to_update.append(product)
+        Product.objects.bulk_update(products_to_update, ["data_translated", "search_vector"])
+        updated += len(products_to_update)
+    return updated
 
 
 def product_translate(*, product: Product, hard_save=False) -> Product:
-    translations = product_translation_filter_by_keys(keys=product.data.keys())
-    product.data = translate_dict_keys(data=product.data, translations=translations)
+    product.data = translate_dict_keys(data=product.data, translations=product_translation_map())
     product.full_clean()
     if hard_save:
         product.save()
@@ -109,6 +293,56 @@ def product_images_replace(*, product: Product, images: list[str]) -> QuerySet[P
     return product.images.all()
 
 
+def product_images_bulk_replace(*, images: dict[int, list[str]]) -> dict[str, int]:
+    """
+    Atomic transaction. Set-based replace of images for many products at once.
+    Current images are loaded with a single query, invalid urls are skipped.
+    Example:
+        images = {product.id: ["https://test.com/test.jpg", "https://test.com/test1.jpg"]}
+    Result:
+        {"added": 1, "removed": 1, "unchanged": 1, "invalid": 0}
+    """
+    current_images = defaultdict(dict)  # {product_id: {url: image_id}}
+    image_ids_to_remove = []
+    for image_id, product_id, url in ProductImage.objects.filter(product_id__in=images.keys()).values_list(
+        "id", "product_id", "url"
+    ):
+        if url in current_images[product_id]:
+            # Duplicated url
+            image_ids_to_remove.append(image_id)
+        else:
+            current_images[product_id][url] = image_id
+
+    result = {"added": 0, "removed": 0, "unchanged": 0, "invalid": 0}
+    images_to_create = []
+    for product_id, urls in images.items():
+        urls = dict.fromkeys(urls)
+        for url, image_id in current_images[product_id].items():
+            if url in urls:
+                result["unchanged"] += 1
+            else:
+                image_ids_to_remove.append(image_id)
+        for url in urls:
+            if url in current_images[product_id]:
+                continue
+            product_image = ProductImage(product_id=product_id, url=url)
+            try:
+                product_image.full_clean(exclude=["product"])
+            except ValidationError:
+                result["invalid"] += 1
+                continue
+            images_to_create.append(product_image)
+
+    with transaction.atomic():
+        if image_ids_to_remove:
+            ProductImage.objects.filter(id__in=image_ids_to_remove).delete()
+        ProductImage.objects.bulk_create(images_to_create)
+
+    result["added"] = len(images_to_create)
+    result["removed"] = len(image_ids_to_remove)
+    return result
+
+
 def product_create_update(*, product_data: dict) -> Product:
     """Create-update product based on [pid] field if product.is_active"""
     try:
@@ -127,49 +361,279 @@ def product_create_update(*, product_data: dict) -> Product:
     return product
 
 
+def product_fingerprint(*, product_data: dict) -> str:
+    """Hash of product feed item fields, used to detect unchanged products between integrations"""
+    fields = {field: product_data.get(field) for field in PRODUCT_FINGERPRINT_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def product_bulk_create_update(
+    *, company: Company, products_data: list[dict], batch_size: int = PRODUCT_BULK_BATCH_SIZE
+) -> dict:
+    """
+    Set-based create-update of company products based on unique [company, pid].
+    Existing products are loaded with a single query, inactive products are never touched,
+    products with unchanged [fingerprint] are not written,
+    invalid items are skipped and reported in result["errors"] by pid.
+    New and changed products are written by a single upsert, so concurrent integrations of the same pid
+    update one row instead of inserting duplicates.
+    Result:
+        {"products": [...], "created": 1, "updated": 1, "unchanged": 1, "skipped": 0, "errors": {"pid": {...}}}
+    """
+    # Deduplicate by pid, the last item wins
+    products_data = {str(product_data["pid"]): product_data for product_data in products_data}
+    existing_products = {
+        product.pid: product
+        for product in Product.objects.filter(company=company, pid__in=products_data.keys()).only(
+            "id", "company_id", "pid", "is_active", "fingerprint", "created_at"
+        )
+    }
+    result = {"products": [], "created": 0, "updated": 0, "unchanged": 0, "skipped": 0, "errors": {}}
+    products_to_create, products_to_update = [], []
+    update_fields = {"updated_at"}
+
+    for pid, product_data in products_data.items():
+        existing_product = existing_products.get(pid)
+        if existing_product is None:
+            products = products_to_create
+        elif not existing_product.is_active:
+            result["skipped"] += 1
+            continue
+        elif existing_product.fingerprint and existing_product.fingerprint == product_data.get("fingerprint"):
+            result["unchanged"] += 1
+            continue
+        else:
+            update_fields.update(product_data.keys())
+            products = products_to_update
+
+        product = Product(**product_data)
+        try:
+            # company is shared and already validated, skip FK lookup and unique check queries per item
+            product.full_clean(exclude=["company"])
+        except ValidationError as e:
+            result["errors"][pid] = e.message_dict
+            continue
+        products.append(product)
+
+    update_fields -= {"company", "pid"}
+    Product.objects.bulk_create(
+        products_to_create + products_to_update,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["company", "pid"],
+        update_fields=sorted(update_fields),
+    )
+    # Upsert does not return primary keys before Django 5.0
+    for product in products_to_update:
+        existing_product = existing_products[product.pid]
+        product.pk, product.created_at = existing_product.pk, existing_product.created_at
+    products_without_pk = {product.pid: product for product in products_to_create if product.pk is None}
+    if products_without_pk:
+        for pid, pk in Product.objects.filter(
+            company=company, pid__in=products_without_pk.keys()
+        ).values_list("pid", "id"):
+            products_without_pk[pid].pk = pk
+
+    result["products"] = products_to_create + products_to_update
+    result["created"] = len(products_to_create)
+    result["updated"] = len(products_to_update)
+    return result
+
+
 class ProductIntegrationService:
     def __init__(self, company_product_link: CompanyProductLink):
         self.company_product_link = company_product_link
         self.raw_products = []
         self.products = []
+        self.report = {
+            "created": 0,
+            "updated": 0,
+            "changed": 0,
+            "unchanged": 0,
+            "skipped": 0,
+            "errors": {},
+            "images": {"added": 0, "removed": 0, "unchanged": 0, "invalid": 0},
+            "not_modified": False,
+        }
+        self.validators = {}
 
     def _invalidate(self):
         self.company_product_link.is_valid = False
         self.company_product_link.save(update_fields=["is_valid"])
 
-    def fetch_products(self, max_attempts=3):
-        attempts = 0
-        while attempts < max_attempts:
-            try:
-                response = requests.get(self.company_product_link.url, timeout=3)
-                response.raise_for_status()  # Raise an exception for non-200 status codes
+    def _conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.company_product_link.etag:
+            headers["If-None-Match"] = self.company_product_link.etag
+        if self.company_product_link.last_modified:
+            headers["If-Modified-Since"] = self.company_product_link.last_modified
+        return headers
+
+    def _is_not_modified(self, response: requests.Response, content_hash: str = "") -> bool:
+        """Remember response validators, check if feed is unchanged since the last integration"""
+        if response.status_code == requests.codes.not_modified:
+            self.report["not_modified"] = True
+            return True
+
+        self.validators = {
+            "etag": response.headers.get("ETag", ""),
+            "last_modified": response.headers.get("Last-Modified", ""),
+            "content_hash": content_hash,
+        }
+        self.report["not_modified"] = content_hash == self.company_product_link.content_hash
+        return self.report["not_modified"]
+
+    def save_validators(self):
+        """Store validators of the fetched feed to skip unchanged feed next time"""
+        if not self.validators:
+            return
+        for field, value in self.validators.items():
+            setattr(self.company_product_link, field, value)
+        self.company_product_link.save(update_fields=list(self.validators))
+
+    def fetch_products(self, max_attempts: int = None):
+        """Fetch the whole feed, network errors are retried by the feed client"""
+        try:
+            response = get_feed_client().get(
+                self.company_product_link.url,
+                headers=self._conditional_headers(),
+                timeout=self.company_product_link.timeouts,
+                max_attempts=max_attempts,
+            )
+            if not self._is_not_modified(response, hashlib.sha256(response.content).hexdigest()):
                 self.raw_products = response.json()
-                break
-            except (JSONDecodeError, InvalidJSONError, HTTPError, ConnectionError):
-                attempts += 1
-                if attempts >= max_attempts:
-                    self._invalidate()
-            except Exception as e:
-                raise e
+        except RequestException:
+            self.validators = {}
+            self._invalidate()
+
+    def stream_products(
+        self, chunk_size: int = PRODUCT_BULK_BATCH_SIZE, max_attempts: int = None
+    ) -> Iterator[list[dict]]:
+        """
+        Fetch products incrementally and yield built products in lists of [chunk_size].
+        Feed is spooled to a temporary file while hashed, so unchanged feed is skipped before parsing
+        and the host slot of the feed client is released before products are saved.
+        Network errors are retried by the feed client, malformed feed invalidates the link
+        and stops the stream - already yielded chunks stay saved.
+        """
+        with SpooledTemporaryFile(max_size=FEED_SPOOL_MAX_SIZE) as feed:
+            content_hash = hashlib.sha256()
+            try:
+                with get_feed_client().open(
+                    self.company_product_link.url,
+                    headers=self._conditional_headers(),
+                    timeout=self.company_product_link.timeouts,
+                    max_attempts=max_attempts,
+                    stream=True,
+                ) as response:
+                    for chunk in response.iter_content(chunk_size=FEED_STREAM_CHUNK_SIZE):
+                        content_hash.update(chunk)
+                        feed.write(chunk)
+            except RequestException:
+                self._invalidate()
+                return
+            if self._is_not_modified(response, content_hash.hexdigest()):
+                return
+
+            feed.seek(0)
+            raw_products = iter_json_array(iter(partial(feed.read, FEED_STREAM_CHUNK_SIZE), b""))
+            try:
+                yield from chunked(map(self.build_product, raw_products), chunk_size)
+            except json.JSONDecodeError:
+                self.validators = {}
+                self._invalidate()
+
+    def feed_request(self) -> dict:
+        """Feed request for AsyncFeedClient"""
+        return {
+            "key": self.company_product_link.pk,
+            "url": self.company_product_link.url,
+            "headers": self._conditional_headers(),
+            "timeouts": self.company_product_link.timeouts,
+        }
+
+    def load_response(self, response: httpx.Response | Exception):
+        """Load products from the feed fetched by AsyncFeedClient, failed or malformed feed invalidates the link"""
+        if isinstance(response, Exception):
+            self._invalidate()
+            return
+        if self._is_not_modified(response, hashlib.sha256(response.content).hexdigest()):
+            return
+        try:
+            self.raw_products = json.loads(response.content)
+        except ValueError:
+            self.validators = {}
+            self._invalidate()
+
+    def build_product(self, product_data: dict) -> dict:
+        return {
+            "company": self.company_product_link.company,
+            "pid": product_data["id"],
+            "name": "default",
+            "price": int(product_data.get("price", 0)),
+            "price_special": int(product_data.get("special", 0)),
+            "url": product_data.get("url", ""),
+            "data": product_data.get("data", {}),
+            "data_options": product_data.get("data_options", {}),
+            "images": product_data.get("images", []),
+        }
 
     def build_products(self):
-        self.products = [
-            {
-                "company": self.company_product_link.company,
-                "pid": product_data["id"],
-                "name": "default",
-                "price": int(product_data.get("price", 0)),
-                "price_special": int(product_data.get("special", 0)),
-                "url": product_data.get("url", ""),
-                "data": product_data.get("data", {}),
-                "data_options": product_data.get("data_options", {}),
-                "images": product_data.get("images", []),
-            }
-            for product_data in self.raw_products
-        ]
-
-    def save_products(self):
-        for product_data in self.products:
-            images = product_data.pop("images", [])
-            product = product_create_update(product_data=product_data)
-            product_images_replace(product=product, images=images)
+        self.products = [self.build_product(product_data) for product_data in self.raw_products]
+
+    def save_products(self, products: list[dict] = None, batch_size: int = PRODUCT_BULK_BATCH_SIZE):
+        company = self.company_product_link.company
+        products = self.products if products is None else products
+        translations = product_translation_map()
+        for products_data in chunked(products, batch_size):
+            images = {}
+            for product_data in products_data:
+                product_data["fingerprint"] = product_fingerprint(product_data=product_data)
+                product_data["data_translated"] = translate_dict_keys(
+                    data=product_data["data"], translations=translations
+                )
+                product_data["search_vector"] = product_search_vector(
+                    name=product_data["name"],
+                    pid=product_data["pid"],
+                    data_translated=product_data["data_translated"],
+                )
+                images[str(product_data["pid"])] = product_data.pop("images", [])
+            result = product_bulk_create_update(
+                company=company, products_data=products_data, batch_size=batch_size
+            )
+            saved_products = result.pop("products")
+            images_result = product_images_bulk_replace(
+                images={product.id: images[product.pid] for product in saved_products}
+            )
+            # QR codes of new and changed products are ready before their documents are requested
+            qr_codes_precompute(product.url for product in saved_products)
+
+            for key, value in images_result.items():
+                self.report["images"][key] += value
+
+            self.report["errors"].update(result.pop("errors"))
+            self.report["changed"] += result["created"] + result["updated"]
+            for key, value in result.items():
+                self.report[key] += value
+
+    def integrate(self, stream=True, response: httpx.Response | Exception = None) -> dict:
+        """
+        Run fetch-build-save pipeline and return integration report.
+        Stream mode keeps peak memory bounded by a single chunk instead of the whole feed.
+        Fetch stage is skipped if [response] is already fetched by AsyncFeedClient.
+        Build and save stages are skipped if feed is not modified since the last integration.
+        """
+        if response is not None:
+            self.load_response(response)
+            self.build_products()
+            self.save_products()
+        elif stream:
+            for products in self.stream_products():
+                self.save_products(products)
+        else:
+            self.fetch_products()
+            self.build_products()
+            self.save_products()
+        if self.company_product_link.is_valid:
+            self.save_validators()
+        return self.report
@@ -0,0 +1,21 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CompanyMember, ProductTranslation
+from .services import product_translation_map_invalidate, user_company_ids_invalidate
+from .tasks import product_retranslate_task
+
+
+@receiver(post_save, sender=ProductTranslation)
+@receiver(post_delete, sender=ProductTranslation)
+def product_translation_changed_signal(sender, instance, **kwargs):
+    product_translation_map_invalidate()
+    keys = sorted({instance.key, instance.tracker.previous("key")} - {None})
+    transaction.on_commit(lambda: product_retranslate_task.delay(keys))
+
+
+@receiver(post_save, sender=CompanyMember)
+@receiver(post_delete, sender=CompanyMember)
+def company_member_changed_signal(sender, instance, **kwargs):
+    user_company_ids_invalidate(user_id=instance.user_id)
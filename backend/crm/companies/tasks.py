@@ -1,47 +1,287 @@
+import time
+
+from celery import chord
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
 from config import celery_app
+from crm.core.utils import (
+    is_docx_template,
+    merge_pdf_files,
+    task_progress_advance,
+    task_progress_start,
+)
 
-from .services import CompanyProductLink, ProductIntegrationService
+from .clients import AsyncFeedClient, get_feed_client_settings
+from .services import (
+    CompanyProductLink,
+    Product,
+    ProductIntegrationService,
+    User,
+    document_create,
+    product_bulk_retranslate,
+    product_document_render,
+    product_offer_create,
+    product_pdf_context,
+)
+
+PRODUCT_OFFER_PARTS_DIR = "offers/parts"
 
 
 @celery_app.task()
-def parse_product_task(company_product_link_pk: int) -> str:
+def parse_product_task(company_product_link_pk: int) -> dict | str:
     try:
         company_product_link = CompanyProductLink.objects.get(pk=company_product_link_pk)
     except CompanyProductLink.DoesNotExist:
         return "Invalid company_product_link_pk"
     else:
         try:
+            started_at = time.monotonic()
             product_integration = ProductIntegrationService(company_product_link)
-            product_integration.fetch_products()
-            product_integration.build_products()
-            product_integration.save_products()
-            return f"Product integration task for {company_product_link_pk} completed successfully."
+            report = product_integration.integrate()
+            return {
+                "link": company_product_link_pk,
+                "duration": round(time.monotonic() - started_at, 3),
+                "report": report,
+            }
         except Exception as e:
             raise e
 
 
-@celery_app.task(bind=True)
-def products_integration_task(self):
+def build_report_summary(report: dict) -> dict:
+    return {
+        "not_modified": report["not_modified"],
+        "created": report["created"],
+        "updated": report["updated"],
+        "unchanged": report["unchanged"],
+        "skipped": report["skipped"],
+        "errors": len(report["errors"]),
+    }
+
+
+@celery_app.task(
+    soft_time_limit=settings.PRODUCTS_INTEGRATION_LINK_SOFT_TIME_LIMIT,
+    time_limit=settings.PRODUCTS_INTEGRATION_LINK_TIME_LIMIT,
+)
+def product_link_integration_task(company_product_link_pk: int, progress_id: str = None) -> dict:
+    """
+    Chord header task of products_integration_task.
+    Integrate a single CompanyProductLink and return its compact summary, failure is reported instead of raised,
+    so one broken link does not fail the whole chord. Finished link is counted in the progress of [progress_id].
+    """
     try:
-        # Get all valid CompanyProductLink instances
-        valid_links = CompanyProductLink.objects.filter(is_valid=True)
-        total_links = valid_links.count()
-        processed_links = 0
-
-        # Iterate through each valid CompanyProductLink and perform the integration steps
-        for company_product_link in valid_links:
-            try:
-                product_integration = ProductIntegrationService(company_product_link)
-                product_integration.fetch_products()
-                product_integration.build_products()
-                product_integration.save_products()
-            except Exception as e:
-                raise e
-            finally:
-                # Update task progress
-                processed_links += 1
-                self.update_state(state="PROGRESS", meta={"current": processed_links, "total": total_links})
-
-        return "Products integration task completed successfully."
+        value = parse_product_task(company_product_link_pk)
     except Exception as e:
-        raise e
+        summary = {"link": company_product_link_pk, "status": "FAILURE", "error": repr(e)}
+    else:
+        if not isinstance(value, dict):
+            summary = {"link": company_product_link_pk, "status": "SUCCESS", "message": value}
+        else:
+            summary = {
+                "link": company_product_link_pk,
+                "status": "SUCCESS",
+                "duration": value["duration"],
+                **build_report_summary(value["report"]),
+            }
+    if progress_id is not None:
+        task_progress_advance(progress_id, failed=summary["status"] != "SUCCESS")
+    return summary
+
+
+@celery_app.task()
+def products_integration_summary_task(summaries: list[dict]) -> dict:
+    """Chord body of products_integration_task: aggregate per-link summaries"""
+    meta = {"current": len(summaries), "total": len(summaries), "failed": 0, "links": {}}
+    for summary in summaries:
+        link_pk = summary.pop("link")
+        meta["links"][link_pk] = summary
+        meta["failed"] += summary["status"] != "SUCCESS"
+    return meta
+
+
+def products_integration_chord(link_pks: list[int], progress_id: str = None):
+    """Chord integrating every link of [link_pks] and aggregating their summaries"""
+    header = [product_link_integration_task.s(link_pk, progress_id=progress_id) for link_pk in link_pks]
+    return chord(header, products_integration_summary_task.s())
+
+
+@celery_app.task(bind=True)
+def products_integration_task(self) -> dict:
+    """
+    Coordinator task. Dispatch product_link_integration_task for every valid CompanyProductLink at once
+    and aggregate per-link results in products_integration_summary_task chord callback.
+    Coordinator is replaced by the chord and does not wait for the links: the summary is the result of its task id,
+    while links are running their aggregated progress is reported by task_progress(task id).
+    !!! Link tasks are routed to PRODUCTS_INTEGRATION_QUEUE, number of links integrated in parallel
+    is the concurrency of the workers consuming that queue
+    """
+    link_pks = list(CompanyProductLink.objects.filter(is_valid=True).values_list("pk", flat=True))
+    task_progress_start(self.request.id, total=len(link_pks))
+    return self.replace(products_integration_chord(link_pks, progress_id=self.request.id))
+
+
+@celery_app.task(
+    bind=True,
+    soft_time_limit=settings.PRODUCTS_INTEGRATION_SOFT_TIME_LIMIT,
+    time_limit=settings.PRODUCTS_INTEGRATION_TIME_LIMIT,
+)
+def products_async_integration_task(self, concurrency: int = None):
+    """
+    Single worker alternative to products_integration_task.
+    Feeds of every valid CompanyProductLink are downloaded concurrently by asyncio in a background thread,
+    at most [concurrency] at once, while this thread builds and saves them in order of completion.
+    Duration in the progress meta covers build and save stages only.
+    Whole sync runs in this task, so its time limits are sized for all links instead of celery defaults.
+    """
+    concurrency = concurrency or settings.PRODUCTS_INTEGRATION_CONCURRENCY
+    links = CompanyProductLink.objects.filter(is_valid=True).select_related("company")
+    integrations = {link.pk: ProductIntegrationService(link) for link in links}
+    meta = {"current": 0, "total": len(integrations), "failed": 0, "links": {}}
+    client = AsyncFeedClient(concurrency=concurrency, **get_feed_client_settings())
+    feed_requests = [integration.feed_request() for integration in integrations.values()]
+
+    for link_pk, response in client.iter_feeds(feed_requests):
+        started_at = time.monotonic()
+        try:
+            report = integrations[link_pk].integrate(response=response)
+        except Exception as e:
+            summary = {"status": "FAILURE", "error": repr(e)}
+        else:
+            duration = round(time.monotonic() - started_at, 3)
+            summary = {"status": "SUCCESS", "duration": duration, **build_report_summary(report)}
+        meta["links"][link_pk] = summary
+        meta["current"] += 1
+        meta["failed"] += summary["status"] != "SUCCESS"
+        self.update_state(state="PROGRESS", meta=meta)
+
+    return meta
+
+
+@celery_app.task(
+    soft_time_limit=settings.PRODUCT_RETRANSLATE_SOFT_TIME_LIMIT,
+    time_limit=settings.PRODUCT_RETRANSLATE_TIME_LIMIT,
+)
+def product_retranslate_task(keys: list[str]) -> dict:
+    """Refresh translated data of products affected by changed ProductTranslation keys"""
+    return {"keys": keys, "updated": product_bulk_retranslate(keys=keys)}
+
+
+@celery_app.task(
+    soft_time_limit=settings.PRODUCT_OFFER_RENDER_SOFT_TIME_LIMIT,
+    time_limit=settings.PRODUCT_OFFER_RENDER_TIME_LIMIT,
+)
+def product_offer_task(
+    user_pk: int, product_pk: int, name: str, base_url: str, pdf_blocks: list[int] = None
+) -> dict:
+    """Render commercial offer outside of request, the document is created when rendering is finished"""
+    user = User.objects.get(pk=user_pk)
+    product = Product.objects.select_related("company").get(pk=product_pk)
+    document = product_offer_create(
+        user=user, product=product, name=name, base_url=base_url, pdf_blocks=pdf_blocks
+    )
+    return {"document": document.pk, "name": document.name, "url": document.url.url}
+
+
+@celery_app.task(
+    soft_time_limit=settings.PRODUCT_OFFER_RENDER_SOFT_TIME_LIMIT,
+    time_limit=settings.PRODUCT_OFFER_RENDER_TIME_LIMIT,
+)
+def product_offer_render_task(
+    user_pk: int,
+    product_pk: int,
+    name: str,
+    base_url: str,
+    pdf_blocks: list[int] = None,
+    merge: bool = False,
+    progress_id: str = None,
+) -> dict:
+    """
+    Chord header task of product_offer_batch_task, render commercial offer of a single product.
+    Offer is saved as a document, or, if it is merged, as a PDF part merged by the chord callback.
+    Rendered offer is counted in the progress of [progress_id].
+    """
+    user = User.objects.get(pk=user_pk)
+    product = Product.objects.select_related("company").get(pk=product_pk)
+    template = product.company.offer_template
+    if merge and not is_docx_template(template):
+        context = product_pdf_context(user=user, product=product, pdf_blocks=pdf_blocks)
+        content, _ = product_document_render(template=template, context=context, base_url=base_url)
+        part = default_storage.save(
+            f"{PRODUCT_OFFER_PARTS_DIR}/{progress_id}/{product_pk}.pdf", ContentFile(content)
+        )
+        result = {"product": product_pk, "part": part}
+    else:
+        document = product_offer_create(
+            user=user, product=product, name=name, base_url=base_url, pdf_blocks=pdf_blocks
+        )
+        result = {"document": document.pk, "product": product_pk, "url": document.url.url}
+    if progress_id is not None:
+        task_progress_advance(progress_id)
+    return result
+
+
+@celery_app.task(
+    soft_time_limit=settings.PRODUCT_OFFER_BATCH_SOFT_TIME_LIMIT,
+    time_limit=settings.PRODUCT_OFFER_BATCH_TIME_LIMIT,
+)
+def product_offer_batch_summary_task(results: list[dict], user_pk: int, name: str) -> dict:
+    """
+    Chord body of product_offer_batch_task.
+    PDF parts of merged offers are saved as a single document of the first product and removed.
+    """
+    meta = {"current": len(results), "total": len(results), "documents": []}
+    parts = [result for result in results if "part" in result]
+    if parts:
+        user = User.objects.get(pk=user_pk)
+        pdf_files = []
+        for part in parts:
+            with default_storage.open(part["part"], "rb") as file:
+                pdf_files.append(file.read())
+        document = document_create(
+            document_data={
+                "pdf_file": {"content": merge_pdf_files(pdf_files), "name": f"{user.username}-offers.pdf"},
+                "name": name,
+                "product": Product.objects.get(pk=parts[0]["product"]),
+            }
+        )
+        for part in parts:
+            default_storage.delete(part["part"])
+        meta["documents"].append(
+            {"document": document.pk, "product": document.product_id, "url": document.url.url}
+        )
+    meta["documents"] += [result for result in results if "document" in result]
+    return meta
+
+
+@celery_app.task(
+    bind=True,
+    soft_time_limit=settings.PRODUCT_OFFER_BATCH_SOFT_TIME_LIMIT,
+    time_limit=settings.PRODUCT_OFFER_BATCH_TIME_LIMIT,
+)
+def product_offer_batch_task(
+    self,
+    user_pk: int,
+    product_pks: list[int],
+    name: str,
+    base_url: str,
+    pdf_blocks: list[int] = None,
+    merge: bool = False,
+) -> dict:
+    """
+    Coordinator task. Render commercial offers of many products in parallel workers,
+    one product_offer_render_task per product, and collect documents in product_offer_batch_summary_task.
+    Coordinator is replaced by the chord: documents are the result of its task id,
+    while offers are rendering their aggregated progress is reported by task_progress(task id).
+    Separate offers are saved as one document per product.
+    Merged offer is saved as a single document of the first product.
+    Offers of companies with DOCX template are never merged.
+    """
+    task_progress_start(self.request.id, total=len(product_pks))
+    header = [
+        product_offer_render_task.s(
+            user_pk, product_pk, name, base_url, pdf_blocks, merge, progress_id=self.request.id
+        )
+        for product_pk in product_pks
+    ]
+    return self.replace(chord(header, product_offer_batch_summary_task.s(user_pk, name)))
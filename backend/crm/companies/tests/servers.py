@@ -0,0 +1,91 @@
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from faker import Faker as OriginalFaker
+
+from .factories import gen_product_data
+
+fake = OriginalFaker()
+
+
+def gen_feed_products(count: int, images_count: int = 2) -> list[dict]:
+    """Build supplier feed items as returned by CompanyProductLink.url"""
+    return [
+        {
+            "id": fake.uuid4(),
+            "price": fake.pyint(min_value=1000000, max_value=1000000000),
+            "special": fake.pyint(min_value=1000000, max_value=1000000000),
+            "url": fake.url(),
+            "data": gen_product_data(),
+            "data_options": {},
+            "images": [fake.image_url() for _ in range(images_count)],
+        }
+        for _ in range(count)
+    ]
+
+
+class FeedRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.server.hits[self.path] += 1
+        time.sleep(self.server.delay)
+        payload = self.server.routes.get(self.path, 404)
+        if isinstance(payload, tuple):
+            # responses are served in order, the last one repeats
+            payload = payload[min(self.server.hits[self.path], len(payload)) - 1]
+        if isinstance(payload, int):
+            self.send_error(payload)
+            return
+        if not isinstance(payload, bytes):
+            payload = json.dumps(payload).encode("utf-8")
+        etag = f'"{hashlib.md5(payload).hexdigest()}"'
+        if self.server.use_etag and self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        if self.server.use_etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def feed_server(
+    routes: dict[str, list | bytes | int | tuple],
+    use_etag: bool = False,
+    hits: Counter = None,
+    delay: float = 0,
+):
+    """
+    Run local http server for product feeds in a background thread, yield base url.
+    Route is a feed, raw bytes, error status or tuple of those served in order.
+    Routes can be changed while server is running, requests per path are counted in [hits],
+    every response is delayed by [delay] seconds.
+    Example:
+        with feed_server({"/feed.json": gen_feed_products(2)}) as base_url:
+            CompanyProductLinkFactory(url=f"{base_url}/feed.json")
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FeedRequestHandler)
+    server.routes = routes
+    server.use_etag = use_etag
+    server.hits = Counter() if hits is None else hits
+    server.delay = delay
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
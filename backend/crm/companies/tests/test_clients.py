@@ -0,0 +1,153 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+
+import httpx
+from django.test import SimpleTestCase
+from requests.exceptions import ConnectionError, HTTPError
+
+from ..clients import AsyncFeedClient, AsyncHostLimiter, FeedClient, HostLimiter, get_feed_client
+from .servers import feed_server, gen_feed_products
+
+
+class HostLimiterTests(SimpleTestCase):
+    def test_min_interval(self):
+        limiter = HostLimiter(max_connections=2, min_interval=0.05)
+        start = time.monotonic()
+        for _ in range(3):
+            with limiter.slot():
+                pass
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+    def test_max_connections(self):
+        limiter = HostLimiter(max_connections=2, min_interval=0)
+        active = []
+        peak = []
+
+        def worker():
+            with limiter.slot():
+                active.append(1)
+                peak.append(len(active))
+                time.sleep(0.02)
+                active.pop()
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(peak), 6)
+        self.assertLessEqual(max(peak), 2)
+
+
+class AsyncHostLimiterTests(SimpleTestCase):
+    def test_min_interval(self):
+        async def run():
+            limiter = AsyncHostLimiter(max_connections=2, min_interval=0.05)
+
+            async def request():
+                async with limiter.slot():
+                    pass
+
+            await asyncio.gather(*(request() for _ in range(3)))
+
+        start = time.monotonic()
+        asyncio.run(run())
+        self.assertGreaterEqual(time.monotonic() - start, 0.1)
+
+
+class FeedClientTests(SimpleTestCase):
+    def setUp(self):
+        self.hits = Counter()
+        self.feed = gen_feed_products(2)
+        self.routes = {
+            "/feed.json": self.feed,
+            "/flaky.json": (503, 502, self.feed),
+            "/unavailable.json": 503,
+            "/missing.json": 404,
+        }
+        self.base_url = self.enterContext(feed_server(self.routes, hits=self.hits))
+        self.client = FeedClient(min_interval=0, backoff_base=0)
+        self.timeout = (1, 1)
+
+    def test_get(self):
+        response = self.client.get(f"{self.base_url}/feed.json", timeout=self.timeout)
+        self.assertEqual(response.json(), self.feed)
+        # keep-alive connection is returned to the pool
+        self.client.get(f"{self.base_url}/feed.json", timeout=self.timeout)
+        pools = self.client.session.get_adapter(self.base_url).poolmanager.pools
+        self.assertEqual(sum(pools[key].num_connections for key in pools.keys()), 1)
+
+    def test_open_stream(self):
+        with self.client.open(f"{self.base_url}/feed.json", timeout=self.timeout, stream=True) as response:
+            content = b"".join(response.iter_content(chunk_size=16))
+        self.assertEqual(json.loads(content), self.feed)
+
+    def test_retry(self):
+        response = self.client.get(f"{self.base_url}/flaky.json", timeout=self.timeout)
+        self.assertEqual(response.json(), self.feed)
+        self.assertEqual(self.hits["/flaky.json"], 3)
+
+    def test_retry_exhausted(self):
+        with self.assertRaises(HTTPError):
+            self.client.get(f"{self.base_url}/unavailable.json", timeout=self.timeout, max_attempts=2)
+        self.assertEqual(self.hits["/unavailable.json"], 2)
+
+    def test_no_retry_client_error(self):
+        with self.assertRaises(HTTPError):
+            self.client.get(f"{self.base_url}/missing.json", timeout=self.timeout)
+        self.assertEqual(self.hits["/missing.json"], 1)
+
+    def test_connection_error(self):
+        with self.assertRaises(ConnectionError):
+            self.client.get("http://127.0.0.1:9/feed.json", timeout=self.timeout, max_attempts=2)
+
+    def test_get_backoff(self):
+        client = FeedClient(backoff_base=1, backoff_max=5)
+        for attempt, (low, high) in enumerate([(0.5, 1), (1, 2), (2, 4), (2.5, 5), (2.5, 5)]):
+            backoff = client.get_backoff(attempt)
+            self.assertGreaterEqual(backoff, low)
+            self.assertLessEqual(backoff, high)
+
+    def test_get_feed_client(self):
+        self.assertIs(get_feed_client(), get_feed_client())
+
+
+class AsyncFeedClientTests(SimpleTestCase):
+    def setUp(self):
+        self.hits = Counter()
+        self.feed = gen_feed_products(2)
+        self.routes = {f"/feed_{i}.json": self.feed for i in range(4)}
+        self.routes.update({"/flaky.json": (503, self.feed), "/missing.json": 404})
+        self.base_url = self.enterContext(feed_server(self.routes, hits=self.hits, delay=0.2))
+        self.client = AsyncFeedClient(concurrency=4, max_connections_per_host=4, backoff_base=0)
+
+    def build_feed_requests(self, paths: list[str]) -> list[dict]:
+        return [{"key": path, "url": f"{self.base_url}{path}", "timeouts": (1, 1)} for path in paths]
+
+    def test_iter_feeds(self):
+        paths = [f"/feed_{i}.json" for i in range(4)] + ["/flaky.json", "/missing.json"]
+        results = dict(self.client.iter_feeds(self.build_feed_requests(paths)))
+        self.assertEqual(set(results), set(paths))
+        for path in paths[:5]:
+            self.assertEqual(results[path].json(), self.feed, path)
+        self.assertIsInstance(results["/missing.json"], httpx.HTTPStatusError)
+        self.assertEqual(self.hits["/flaky.json"], 2)
+
+    def test_iter_feeds_concurrency(self):
+        paths = [f"/feed_{i}.json" for i in range(4)]
+        start = time.monotonic()
+        list(self.client.iter_feeds(self.build_feed_requests(paths)))
+        # 4 delayed responses are downloaded at once
+        self.assertLess(time.monotonic() - start, 0.6)
+
+    def test_iter_feeds_stop(self):
+        client = AsyncFeedClient(concurrency=1, max_connections_per_host=1)
+        paths = [f"/feed_{i}.json" for i in range(4)]
+        feeds = client.iter_feeds(self.build_feed_requests(paths))
+        next(feeds)
+        feeds.close()
+        # pending downloads are cancelled
+        self.assertLess(sum(self.hits.values()), 4)
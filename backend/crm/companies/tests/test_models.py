@@ -360,6 +360,13 @@ class DealTests(TestCase):
         self.deal.full_clean()
         self.deal.save()
         self.assertEqual(self.deal.product, self.other_product)
+        self.assertEqual(self.deal.company_id, self.other_product.company_id)
+
+    def test_product_company_changed(self):
+        self.product.company = self.other_product.company
+        self.product.save()
+        self.deal.refresh_from_db()
+        self.assertEqual(self.deal.company_id, self.other_product.company_id)
 
     def test_delete(self):
         self.deal.delete()
@@ -389,6 +396,7 @@ class DealTests(TestCase):
         self.assertEqual(self.deal.manager, self.manager)
         self.assertEqual(self.deal.customer, self.customer)
         self.assertEqual(self.deal.product, self.product)
+        self.assertEqual(self.deal.company, self.product.company)
         self.assertTrue(self.deal.created_at)
         self.assertTrue(self.deal.updated_at)
 
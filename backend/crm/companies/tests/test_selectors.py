@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.db.models.query import QuerySet
 from django.test import TestCase
 
@@ -14,6 +15,8 @@ from ..selectors import (
     pdf_block_list,
     pdf_block_list_filter_by_ids,
     product_list,
+    product_translation_map,
+    tenant_context,
     user_get_company_ids,
     user_list,
 )
@@ -25,6 +28,7 @@ from .factories import (
     CustomerFactory,
     DealFactory,
     ProductFactory,
+    ProductTranslationFactory,
 )
 
 
@@ -88,9 +92,30 @@ class TestSelectors(TestCase):
         for user, expected_result in test_cases:
             result = user_get_company_ids(user)
             # test result
-            self.assertIsInstance(result, QuerySet)
+            self.assertIsInstance(result, list)
             self.assertFalse(set(result) - set(expected_result))
 
+    def test_user_get_company_ids_cached(self):
+        company_ids = user_get_company_ids(self.admin)
+        with self.assertNumQueries(0):
+            self.assertEqual(user_get_company_ids(self.admin), company_ids)
+        # Test cache is invalidated by membership changes
+        member = CompanyMemberFactory(user=self.admin, company=self.company_1)
+        self.assertCountEqual(user_get_company_ids(self.admin), [self.company.id, self.company_1.id])
+        member.delete()
+        self.assertEqual(user_get_company_ids(self.admin), [self.company.id])
+
+    def test_user_get_company_ids_tenant_context(self):
+        token = tenant_context.set({})
+        try:
+            company_ids = user_get_company_ids(self.admin)
+            cache.clear()
+            # Test ids are resolved once per context
+            with self.assertNumQueries(0):
+                self.assertIs(user_get_company_ids(self.admin), company_ids)
+        finally:
+            tenant_context.reset(token)
+
     def test_user_list(self):
         test_cases = [  # for_user, expected_result
             (self.superuser, [self.superuser, self.manager, self.admin]),
@@ -221,3 +246,15 @@ class TestSelectors(TestCase):
             # test result
             self.assertIsInstance(result, QuerySet)
             self.assertFalse(set(result) - set(expected_result))
+
+    def test_product_translation_map(self):
+        translation = ProductTranslationFactory()
+        translation_map = product_translation_map()
+        self.assertEqual(translation_map, {translation.key: translation.value})
+        # Test map is loaded once
+        with self.assertNumQueries(0):
+            self.assertIs(product_translation_map(), translation_map)
+        # Test map is reloaded if cache is lost
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(product_translation_map(), translation_map)
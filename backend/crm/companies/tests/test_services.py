@@ -1,18 +1,37 @@
+from io import StringIO
+from unittest.mock import patch
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.template import engines
 from django.test import RequestFactory, TestCase
+from docx import Document as DocxDocument
 
-from crm.core.utils import html_to_pdf
+from crm.core.utils import get_docx_renderer, html_to_pdf, qr_code_cache_key
+from crm.documents.tests.factories import PDFBlockFactory
 
 from ..services import (
     ProductIntegrationService,
     company_create,
     company_render_business_card,
     document_create,
+    document_templates_warm_up,
+    product_bulk_create_update,
+    product_bulk_retranslate,
     product_create_update,
+    product_fingerprint,
     product_image_create,
+    product_images_bulk_replace,
     product_images_replace,
+    product_offer_create,
+    product_pdf_context,
+    product_search_vector,
     product_translate,
     product_translation_filter_by_keys,
+    product_translation_map_invalidate,
     translate_dict_keys,
     user_create,
 )
@@ -20,6 +39,7 @@ from .factories import (
     Company,
     CompanyFactory,
     CompanyMember,
+    CompanyMemberFactory,
     CompanyProductLinkFactory,
     Product,
     ProductFactory,
@@ -28,6 +48,7 @@ from .factories import (
     ProductTranslationFactory,
     UserFactory,
 )
+from .servers import feed_server, gen_feed_products
 
 User = get_user_model()
 
@@ -125,19 +146,78 @@ class ServicesTests(TestCase):
         self.assertEqual(translations, translations_filtered)
 
     def test_translate_dict_keys(self):
-        translations = product_translation_filter_by_keys(keys=self.keys)
-        data = translate_dict_keys(data=self.product.data, translations=translations)
+        translations = {"brand": "Бренд", "model": "Модель", "test": "Тест"}
+        with self.assertNumQueries(0):
+            data = translate_dict_keys(data=self.product.data, translations=translations)
         self.assertEqual(data, self.product_data_expected_result)
+        self.assertEqual(list(data), ["Бренд", "Модель", "doors"])
 
     def test_product_translate(self):
         product = product_translate(product=self.product)
         self.assertEqual(product.data, self.product_data_expected_result)
 
+    def test_product_translate_cached(self):
+        product_translate(product=ProductFactory(company=self.company))
+        # only company lookup by full_clean
+        with self.assertNumQueries(1):
+            product = product_translate(product=self.product)
+        self.assertEqual(product.data, self.product_data_expected_result)
+
+    def test_product_translation_map_invalidate(self):
+        test_cases = [  # (action, expected_key)
+            (lambda: ProductTranslationFactory(key="doors", value="Двери"), "Двери"),
+            (lambda: ProductTranslation.objects.filter(key="doors").update(value="Дверей"), "Двери"),
+            (lambda: ProductTranslation.objects.get(key="doors").save(), "Дверей"),
+            (lambda: ProductTranslation.objects.filter(key="doors").delete(), "doors"),
+        ]
+        for action, expected_key in test_cases:
+            product_translate(product=ProductFactory(company=self.company))
+            action()
+            product = product_translate(product=ProductFactory(company=self.company, data={"doors": 4}))
+            self.assertEqual(product.data, {expected_key: 4}, expected_key)
+
     def test_product_translate_hard_save(self):
         product = product_translate(product=self.product, hard_save=True)
         product.refresh_from_db()
         self.assertEqual(product.data, self.product_data_expected_result)
 
+    def test_product_save_translates_data(self):
+        self.assertEqual(self.product.data_translated, self.product_data_expected_result)
+        self.assertEqual(self.product.data["brand"], "BMW")
+
+    def test_product_bulk_retranslate(self):
+        other_product = ProductFactory(company=self.company, data={"doors": 2})
+        ProductTranslation.objects.filter(key="brand").update(value="Марка")
+        product_translation_map_invalidate()
+        # translations, products and update
+        with self.assertNumQueries(3):
+            updated = product_bulk_retranslate(keys=["brand"])
+        self.assertEqual(updated, 1)
+        self.product.refresh_from_db()
+        other_product.refresh_from_db()
+        self.assertEqual(self.product.data_translated, {"Марка": "BMW", "Модель": "E3", "doors": 4})
+        self.assertEqual(other_product.data_translated, {"doors": 2})
+        # Test translated products are not updated again
+        self.assertEqual(product_bulk_retranslate(keys=["brand"]), 0)
+
+    def test_product_translation_changed_signal(self):
+        test_cases = [  # (translation_data, expected_data_translated)
+            ({"value": "Марка"}, {"Марка": "BMW", "Модель": "E3", "doors": 4}),
+            ({"key": "doors", "value": "Двери"}, {"brand": "BMW", "Модель": "E3", "Двери": 4}),
+        ]
+        for translation_data, expected_data_translated in test_cases:
+            with self.settings(CELERY_TASK_ALWAYS_EAGER=True), self.captureOnCommitCallbacks(execute=True):
+                for field, value in translation_data.items():
+                    setattr(self.translation, field, value)
+                self.translation.save()
+            self.product.refresh_from_db()
+            self.assertEqual(self.product.data_translated, expected_data_translated)
+        # Test deleted translation
+        with self.settings(CELERY_TASK_ALWAYS_EAGER=True), self.captureOnCommitCallbacks(execute=True):
+            self.translation.delete()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.data_translated, {"brand": "BMW", "Модель": "E3", "doors": 4})
+
     def test_product_image_create(self):
         product_image = product_image_create(product=self.product, url=self.test_url)
         self.assertIsInstance(product_image, ProductImage)
@@ -165,6 +245,37 @@ class ServicesTests(TestCase):
             self.assertFalse(expected_images_set - set(images))
             self.assertEqual(ProductImage.objects.count(), expected_count)
 
+    def test_product_images_bulk_replace(self):
+        other_product = ProductFactory(company=self.company)
+        images_1 = ["https://test.com/test.jpg", "https://test.com/test1.jpg"]
+        images_2 = ["https://test.com/test.jpg", "https://test.com/new_image.jpg", "invalid url"]
+        test_cases = [  # images, expected_result, expected_queries
+            (
+                {self.product.id: images_1, other_product.id: images_1},
+                {"added": 4, "removed": 0, "unchanged": 0, "invalid": 0},
+                4,  # select, savepoint, insert, release
+            ),
+            (
+                {self.product.id: images_1, other_product.id: images_1},
+                {"added": 0, "removed": 0, "unchanged": 4, "invalid": 0},
+                3,  # select, savepoint, release
+            ),
+            (
+                {self.product.id: images_2, other_product.id: []},
+                {"added": 1, "removed": 3, "unchanged": 1, "invalid": 1},
+                5,  # select, savepoint, delete, insert, release
+            ),
+        ]
+        for images, expected_result, expected_queries in test_cases:
+            with self.assertNumQueries(expected_queries):
+                result = product_images_bulk_replace(images=images)
+            self.assertEqual(result, expected_result)
+        self.assertEqual(
+            set(self.product.images.values_list("url", flat=True)),
+            {"https://test.com/test.jpg", "https://test.com/new_image.jpg"},
+        )
+        self.assertFalse(other_product.images.exists())
+
     def test_product_create_update(self):
         product = product_create_update(product_data=self.product_data)
         self.assertIsInstance(product, Product)
@@ -179,6 +290,135 @@ class ServicesTests(TestCase):
         self.assertIsInstance(product, Product)
         self.assertFalse(product_inactive.is_active)
 
+    def test_product_bulk_create_update(self):
+        products_data = [
+            {**self.product_data, "pid": "new-1"},
+            {**self.product_data, "pid": "new-2"},
+            {**self.product_data, "pid": self.product.pid, "name": "updated"},
+        ]
+        with self.assertNumQueries(3):  # select, upsert, select ids of created
+            result = product_bulk_create_update(company=self.company, products_data=products_data)
+        self.product.refresh_from_db()
+        self.assertEqual(result["created"], 2)
+        self.assertEqual(result["updated"], 1)
+        self.assertEqual(len(result["products"]), 3)
+        self.assertEqual(self.product.name, "updated")
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_product_bulk_create_update_conflict_will_update(self):
+        # product inserted by a concurrent integration after existing products were loaded
+        product = ProductFactory(company=self.company, pid="new")
+        querysets = [Product.objects.none(), Product.objects.filter(pid="new")]
+        with patch.object(Product.objects, "filter", side_effect=querysets):
+            result = product_bulk_create_update(
+                company=self.company, products_data=[{**self.product_data, "pid": "new", "name": "updated"}]
+            )
+        product.refresh_from_db()
+        self.assertEqual(Product.objects.filter(pid="new").count(), 1)
+        self.assertEqual(result["products"][0].pk, product.pk)
+        self.assertEqual(product.name, "updated")
+
+    def test_product_bulk_create_update_unchanged_will_not_update(self):
+        product_data = {**self.product_data, "pid": "123", "fingerprint": "hash"}
+        product_bulk_create_update(company=self.company, products_data=[product_data])
+        product = Product.objects.get(pid="123")
+        test_cases = [  # product_data, expected_result_key
+            ({**product_data, "name": "unchanged"}, "unchanged"),
+            ({**product_data, "name": "changed", "fingerprint": "changed hash"}, "updated"),
+        ]
+        for product_data, expected_result_key in test_cases:
+            result = product_bulk_create_update(company=self.company, products_data=[product_data])
+            self.assertEqual(result[expected_result_key], 1)
+        product.refresh_from_db()
+        self.assertEqual(product.name, "changed")
+        self.assertEqual(product.fingerprint, "changed hash")
+
+    def test_product_save_resets_fingerprint(self):
+        Product.objects.filter(pk=self.product.pk).update(fingerprint="hash")
+        self.product.refresh_from_db()
+        self.product.save()
+        self.assertEqual(self.product.fingerprint, "")
+
+    def test_product_save_generates_pid(self):
+        products = [Product.objects.create(**{**self.product_data, "pid": ""}) for _ in range(2)]
+        self.assertTrue(all(product.pid for product in products))
+        self.assertNotEqual(products[0].pid, products[1].pid)
+
+    def test_product_fingerprint(self):
+        fingerprint = product_fingerprint(product_data={**self.product_data, "images": []})
+        test_cases = [  # product_data, is_equal
+            ({**self.product_data, "images": [], "company": None, "pid": "other"}, True),
+            ({**self.product_data, "images": [self.test_url]}, False),
+            ({**self.product_data, "images": [], "price": 1}, False),
+        ]
+        for product_data, is_equal in test_cases:
+            self.assertEqual(product_fingerprint(product_data=product_data) == fingerprint, is_equal)
+
+    def test_product_bulk_create_update_inactive_will_not_update(self):
+        product_inactive = ProductFactory(company=self.company, pid="123", is_active=False)
+        result = product_bulk_create_update(
+            company=self.company, products_data=[{**self.product_data, "pid": "123", "name": "updated"}]
+        )
+        product_inactive.refresh_from_db()
+        self.assertEqual(result["skipped"], 1)
+        self.assertFalse(result["products"])
+        self.assertNotEqual(product_inactive.name, "updated")
+
+    def test_product_bulk_create_update_reports_errors(self):
+        products_data = [
+            {**self.product_data, "pid": "valid"},
+            {**self.product_data, "pid": "invalid", "url": "not url"},
+        ]
+        result = product_bulk_create_update(company=self.company, products_data=products_data)
+        self.assertEqual(result["created"], 1)
+        self.assertIn("invalid", result["errors"])
+        self.assertIn("url", result["errors"]["invalid"])
+        self.assertFalse(Product.objects.filter(pid="invalid").exists())
+
+    def test_product_pdf_context(self):
+        context = product_pdf_context(user=self.user, product=self.product)
+        self.assertEqual(context["product"], self.product)
+        self.assertEqual(context["company"], self.company)
+        self.assertEqual(context["file_name"], f"{self.user.username}-{self.product.id}.pdf")
+        self.assertTrue(context["qr_code"])
+
+    def test_product_offer_create(self):
+        document = product_offer_create(
+            user=self.user, product=self.product, name="test document", base_url="http://testserver/"
+        )
+        self.assertEqual(document.name, "test document")
+        self.assertEqual(document.product, self.product)
+        self.assertIn(f"{self.user.username}-{self.product.id}", document.url.name)
+
+    def test_product_offer_create_docx(self):
+        self.company.offer_template = Company.CommercialOfferTemplates.TEMPLATE_1_DOCX
+        self.company.save()
+        pdf_block = PDFBlockFactory(company=self.company, text="<p>Текст блока &amp; <b>тест</b></p>")
+        CompanyMemberFactory(company=self.company, user=self.user)
+        document = product_offer_create(
+            user=self.user,
+            product=self.product,
+            name="test",
+            base_url="http://testserver/",
+            pdf_blocks=[pdf_block.pk],
+        )
+        docx_document = DocxDocument(document.url.open("rb"))
+        # test DOCX offer has the same content as PDF offer
+        self.assertIn("Текст блока & тест", [paragraph.text for paragraph in docx_document.paragraphs])
+        self.assertEqual(len(docx_document.inline_shapes), 1)
+
+    def test_document_templates_warm_up(self):
+        templates = document_templates_warm_up()
+        self.assertIn(Company.CommercialOfferTemplates.TEMPLATE_1, templates)
+        template_loader = engines["django"].engine.template_loaders[0]
+        self.assertIn(Company.CommercialOfferTemplates.TEMPLATE_1, template_loader.get_template_cache)
+        self.assertEqual(len(get_docx_renderer().templates), 2)
+
+    def test_document_templates_warm_up_missing_stylesheet(self):
+        with patch("crm.companies.services.find_static", return_value=None):
+            templates = document_templates_warm_up()
+        self.assertIn(Company.CommercialOfferTemplates.TEMPLATE_1, templates)
+
     def test_company_render_business_card(self):
         user = self.user
         business_card = "Я {first_name} {middle_name} {last_name} {phone_number} {email}"
@@ -235,6 +475,8 @@ class ProductIntegrationServiceTests(TestCase):
         self.assertTrue(self.product_link.is_valid)
         self.assertEqual(Product.objects.count(), 2)
         self.assertEqual(ProductImage.objects.count(), 68)
+        self.assertEqual(self.integration.report["created"], 2)
+        self.assertEqual(self.integration.report["images"]["added"], 68)
         # Test repeating save will not create duplicated
         self.integration.build_products()
         self.integration.save_products()
@@ -247,3 +489,151 @@ class ProductIntegrationServiceTests(TestCase):
         self.integration_invalid.save_products()
         # test products not added
         self.assertEqual(Product.objects.count(), 0)
+
+
+class ProductIntegrationServiceStreamTests(TestCase):
+    def setUp(self):
+        self.feed_products = gen_feed_products(5)
+        self.base_url = self.enterContext(
+            feed_server(
+                {
+                    "/feed.json": self.feed_products,
+                    "/invalid.json": b'[{"id": 1}, {"id"',
+                    "/flaky.json": (503, self.feed_products),
+                    "/unavailable.json": 503,
+                }
+            )
+        )
+        self.product_link = CompanyProductLinkFactory(url=f"{self.base_url}/feed.json")
+        self.integration = ProductIntegrationService(self.product_link)
+
+    def test_stream_products(self):
+        chunks = list(self.integration.stream_products(chunk_size=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2, 1])
+        self.assertEqual(chunks[0][0], self.integration.build_product(self.feed_products[0]))
+        self.assertTrue(self.product_link.is_valid)
+
+    def test_stream_products_invalid(self):
+        test_cases = [  # url
+            f"{self.base_url}/invalid.json",
+            f"{self.base_url}/not-found.json",
+            f"{self.base_url}/unavailable.json",
+        ]
+        for url in test_cases:
+            product_link = CompanyProductLinkFactory(url=url)
+            integration = ProductIntegrationService(product_link)
+            list(integration.stream_products(max_attempts=1))
+            self.assertFalse(product_link.is_valid, url)
+
+    def test_stream_products_retry(self):
+        product_link = CompanyProductLinkFactory(url=f"{self.base_url}/flaky.json")
+        chunks = list(ProductIntegrationService(product_link).stream_products(max_attempts=2))
+        self.assertEqual(sum(len(chunk) for chunk in chunks), 5)
+        self.assertTrue(product_link.is_valid)
+
+    def test_integrate(self):
+        ProductTranslationFactory(key="brand", value="Бренд")
+        report = self.integration.integrate()
+        self.assertEqual(report["created"], 5)
+        product = self.product_link.company.products.get(pid=self.feed_products[0]["id"])
+        self.assertEqual(product.data_translated["Бренд"], self.feed_products[0]["data"]["brand"])
+        self.assertEqual(report["images"]["added"], 10)
+        self.assertIsNotNone(cache.get(qr_code_cache_key(product.url)))
+        self.assertEqual(self.product_link.company.products.count(), 5)
+        # Test repeating integration of modified feed will update existing
+        self.product_link.content_hash = ""
+        report = ProductIntegrationService(self.product_link).integrate()
+        self.assertEqual(report["created"], 0)
+        self.assertEqual(report["unchanged"], 5)
+        self.assertEqual(report["images"]["added"], 0)
+        # Test changed products will be updated
+        self.feed_products[0]["price"] = 1
+        self.product_link.content_hash = ""
+        report = ProductIntegrationService(self.product_link).integrate()
+        self.assertEqual(report["changed"], 1)
+        self.assertEqual(report["updated"], 1)
+        self.assertEqual(report["unchanged"], 4)
+
+    def test_integrate_not_modified(self):
+        test_cases = [  # use_etag
+            True,
+            False,
+        ]
+        for use_etag in test_cases:
+            routes = {"/feed.json": gen_feed_products(2)}
+            base_url = self.enterContext(feed_server(routes, use_etag=use_etag))
+            product_link = CompanyProductLinkFactory(url=f"{base_url}/feed.json")
+            report = ProductIntegrationService(product_link).integrate()
+            self.assertFalse(report["not_modified"])
+            self.assertEqual(report["created"], 2)
+            self.assertTrue(product_link.content_hash)
+            self.assertEqual(bool(product_link.etag), use_etag)
+            # Test unchanged feed will skip build and save
+            for stream in [True, False]:
+                report = ProductIntegrationService(product_link).integrate(stream=stream)
+                self.assertTrue(report["not_modified"])
+                self.assertEqual(report["created"] + report["updated"], 0)
+            # Test changed feed will be saved
+            routes["/feed.json"] = gen_feed_products(1)
+            report = ProductIntegrationService(product_link).integrate()
+            self.assertFalse(report["not_modified"])
+            self.assertEqual(report["created"], 1)
+
+
+class ProductSearchVectorTests(TestCase):
+    def setUp(self):
+        self.company = CompanyFactory()
+        ProductTranslationFactory(key="brand", value="Производитель")
+        self.product = ProductFactory(company=self.company, name="Седан", data={"brand": "Лада"})
+
+    def search(self, query: str) -> list[int]:
+        products = Product.objects.filter(search_vector=SearchQuery(query))
+        return list(products.values_list("id", flat=True))
+
+    def test_product_save(self):
+        for query in ["Седан", self.product.pid, "Лада", "Производитель"]:
+            self.assertEqual(self.search(query), [self.product.id], query)
+        self.product.name = "Универсал"
+        self.product.save()
+        self.assertEqual(self.search("Универсал"), [self.product.id])
+        self.assertEqual(self.search("Седан"), [])
+
+    def test_product_search_vector_weights(self):
+        other_product = ProductFactory(company=self.company, name="Лада", data={"model": "Седан"})
+        rank = SearchRank(F("search_vector"), SearchQuery("Лада"))
+        products = (
+            Product.objects.filter(search_vector=SearchQuery("Лада")).annotate(rank=rank).order_by("-rank")
+        )
+        # Test name match is ranked above data match
+        self.assertEqual(list(products.values_list("id", flat=True)), [other_product.id, self.product.id])
+
+    def test_product_bulk_create_update(self):
+        product_data = {"company": self.company, "pid": "new", "name": "Хэтчбек", "url": "https://test.com/"}
+        product_data.update(data={"brand": "Лада"}, data_translated={"Производитель": "Лада"})
+        product_data["search_vector"] = product_search_vector(
+            name="Хэтчбек", pid="new", data_translated=product_data["data_translated"]
+        )
+        product_bulk_create_update(company=self.company, products_data=[product_data])
+        self.assertEqual(self.search("Хэтчбек"), [Product.objects.get(pid="new").id])
+
+    def test_product_bulk_retranslate(self):
+        ProductTranslation.objects.filter(key="brand").update(value="Марка")
+        product_translation_map_invalidate()
+        product_bulk_retranslate(keys=["brand"])
+        self.assertEqual(self.search("Марка"), [self.product.id])
+
+    def test_update_product_search_vectors_command(self):
+        Product.objects.update(search_vector=None)
+        stdout = StringIO()
+        call_command("update_product_search_vectors", stdout=stdout)
+        self.assertIn("Updated product search vectors: 1", stdout.getvalue())
+        self.assertEqual(self.search("Седан"), [self.product.id])
+        call_command("update_product_search_vectors", stdout=stdout)
+        self.assertIn("Updated product search vectors: 0", stdout.getvalue())
+
+    def test_benchmark_product_search_command(self):
+        stdout = StringIO()
+        call_command("benchmark_product_search", query="Седан", runs=2, stdout=stdout)
+        output = stdout.getvalue()
+        self.assertIn("built: runs=2", output)
+        self.assertIn("stored: runs=2 found=1", output)
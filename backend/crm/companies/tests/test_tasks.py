@@ -1,8 +1,27 @@
 import pytest
 from celery.result import EagerResult
+from django.core.files.storage import default_storage
 
-from ..tasks import parse_product_task, products_integration_task
-from .factories import CompanyFactory, CompanyProductLinkFactory, Product
+from crm.core.utils import task_progress
+from crm.documents.tests.factories import Document, PDFBlockFactory
+
+from ..tasks import (
+    PRODUCT_OFFER_PARTS_DIR,
+    parse_product_task,
+    product_offer_batch_task,
+    product_offer_task,
+    products_async_integration_task,
+    products_integration_task,
+)
+from .factories import (
+    CompanyFactory,
+    CompanyMemberFactory,
+    CompanyProductLinkFactory,
+    Product,
+    ProductFactory,
+    UserFactory,
+)
+from .servers import feed_server, gen_feed_products
 
 
 @pytest.mark.django_db
@@ -28,7 +47,120 @@ def test_products_integration_task(settings):
     link_invalid.refresh_from_db()
     # test task result
     assert isinstance(result, EagerResult)
+    assert result.get()["total"] == 3
     assert Product.objects.count() == 4
     assert company.products.count() == 2
     assert other_company.products.count() == 2
     assert link_invalid.is_valid is False
+
+
+@pytest.mark.django_db
+def test_products_integration_task_fan_out(settings):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    routes = {
+        "/feed.json": gen_feed_products(2),
+        "/other_feed.json": gen_feed_products(3),
+        "/broken_feed.json": [{"price": 1}],  # item without id
+    }
+    with feed_server(routes) as base_url:
+        link = CompanyProductLinkFactory(url=f"{base_url}/feed.json")
+        link_broken = CompanyProductLinkFactory(url=f"{base_url}/broken_feed.json")
+        link_other = CompanyProductLinkFactory(url=f"{base_url}/other_feed.json")
+        link_invalid = CompanyProductLinkFactory(url=f"{base_url}/not_found.json")
+        result = products_integration_task.delay()
+    meta = result.get()
+    link_invalid.refresh_from_db()
+    # test broken link will not block the others
+    assert Product.objects.count() == 5
+    assert meta["current"] == meta["total"] == 4
+    assert meta["failed"] == 1
+    assert meta["links"][link.pk]["created"] == 2
+    assert meta["links"][link_other.pk]["created"] == 3
+    assert meta["links"][link_broken.pk]["status"] == "FAILURE"
+    assert meta["links"][link_invalid.pk]["status"] == "SUCCESS"
+    assert link_invalid.is_valid is False
+    # test aggregated progress of the links
+    assert task_progress(result.id) == {"current": 4, "total": 4, "failed": 1}
+
+
+@pytest.mark.django_db
+def test_products_async_integration_task(settings):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    routes = {
+        "/feed.json": gen_feed_products(2),
+        "/other_feed.json": gen_feed_products(3),
+        "/broken_feed.json": [{"price": 1}],  # item without id
+        "/malformed_feed.json": b"[{",
+    }
+    with feed_server(routes, use_etag=True) as base_url:
+        link = CompanyProductLinkFactory(url=f"{base_url}/feed.json")
+        link_broken = CompanyProductLinkFactory(url=f"{base_url}/broken_feed.json")
+        link_other = CompanyProductLinkFactory(url=f"{base_url}/other_feed.json")
+        link_malformed = CompanyProductLinkFactory(url=f"{base_url}/malformed_feed.json")
+        link_invalid = CompanyProductLinkFactory(url=f"{base_url}/not_found.json")
+        meta = products_async_integration_task.delay(concurrency=2).get()
+        # test unchanged feeds are not modified on the next run
+        meta_repeat = products_async_integration_task.delay(concurrency=2).get()
+    link_invalid.refresh_from_db()
+    link_malformed.refresh_from_db()
+    # test broken link will not block the others
+    assert Product.objects.count() == 5
+    assert meta["current"] == meta["total"] == 5
+    assert meta["failed"] == 1
+    assert meta["links"][link.pk]["created"] == 2
+    assert meta["links"][link_other.pk]["created"] == 3
+    assert meta["links"][link_broken.pk]["status"] == "FAILURE"
+    assert meta["links"][link_invalid.pk]["status"] == "SUCCESS"
+    assert link_invalid.is_valid is False
+    assert link_malformed.is_valid is False
+    assert meta_repeat["total"] == 3
+    assert meta_repeat["links"][link.pk]["not_modified"] is True
+    assert meta_repeat["links"][link_other.pk]["not_modified"] is True
+
+
+@pytest.mark.django_db
+def test_product_offer_task(settings):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    user = UserFactory()
+    product = ProductFactory()
+    result = product_offer_task.delay(user.pk, product.pk, "test document", "http://testserver/").get()
+    document = product.document_set.get()
+    assert result == {"document": document.pk, "name": "test document", "url": document.url.url}
+
+
+@pytest.mark.django_db
+def test_product_offer_batch_task(settings):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    company = CompanyFactory()
+    user = CompanyMemberFactory(company=company).user
+    pdf_block = PDFBlockFactory(company=company)
+    products = ProductFactory.create_batch(4, company=company)
+    product_pks = [product.pk for product in reversed(products)]
+    # Every product is rendered by its own task of the chord
+    result = product_offer_batch_task.delay(
+        user.pk, product_pks, "test", "http://testserver/", [pdf_block.pk]
+    )
+    meta = result.get()
+    assert task_progress(result.id) == {"current": 4, "total": 4, "failed": 0}
+    assert meta["current"] == meta["total"] == 4
+    assert [document["product"] for document in meta["documents"]] == product_pks
+    assert Document.objects.filter(name="test").count() == 4
+
+
+@pytest.mark.django_db
+def test_product_offer_batch_task_merge(settings):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    user = UserFactory()
+    products = ProductFactory.create_batch(3)
+    product_pks = [product.pk for product in products]
+    result = product_offer_batch_task.delay(user.pk, product_pks, "test", "http://testserver/", merge=True)
+    meta = result.get()
+    document = Document.objects.get()
+    assert meta["current"] == meta["total"] == 3
+    assert meta["documents"] == [
+        {"document": document.pk, "product": products[0].pk, "url": document.url.url}
+    ]
+    assert f"{user.username}-offers" in document.url.name
+    # PDF parts are removed after merge
+    for product_pk in product_pks:
+        assert not default_storage.exists(f"{PRODUCT_OFFER_PARTS_DIR}/{result.id}/{product_pk}.pdf")
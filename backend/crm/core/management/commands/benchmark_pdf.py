@@ -0,0 +1,80 @@
+import statistics
+import time
+from collections.abc import Callable
+
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.finders import find
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+from weasyprint import HTML
+
+from crm.companies.models import Product
+from crm.companies.services import product_pdf_context
+from crm.core.utils import create_pdf_render_pool, find_stylesheets, render_pdf
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Benchmark PDF render latency of a cold render per call against the warm renderer"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--renders", type=int, default=20, help="Number of renders per mode")
+        parser.add_argument("--template", default="commercial-offers/1.html")
+        parser.add_argument("--css", nargs="*", default=["css/pdf.css"], help="Static paths of stylesheets")
+        parser.add_argument("--product", type=int, help="Product id, the first product by default")
+        parser.add_argument("--base-url", default="http://localhost/")
+        parser.add_argument(
+            "--processes", type=int, default=0, help="Also benchmark render pool of N processes"
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.select_related("company")
+        product = products.filter(pk=options["product"]).first() if options["product"] else products.first()
+        if product is None:
+            raise CommandError("Product not found")
+        user = User.objects.filter(memberships__company=product.company).first() or User.objects.first()
+        if user is None:
+            raise CommandError("User not found")
+
+        context = product_pdf_context(user=user, product=product)
+        html = render_to_string(options["template"], context)
+        base_url, css = options["base_url"], options["css"]
+
+        def render_cold():
+            # html_to_pdf before the warm renderer: stylesheets are found, parsed and fonts loaded per call
+            css_paths = [find(path) for path in css]
+            return HTML(string=html, base_url=base_url).write_pdf(stylesheets=css_paths)
+
+        def render_warm():
+            return render_pdf(html, find_stylesheets(css), base_url)
+
+        modes = [("cold", render_cold), ("warm", render_warm)]
+        if options["processes"]:
+            pool = create_pdf_render_pool(options["processes"])
+
+            def render_pool():
+                return pool.submit(render_pdf, html, find_stylesheets(css), base_url).result()
+
+            modes.append((f"pool x{options['processes']}", render_pool))
+
+        for name, render in modes:
+            self.report(name, self.measure(render, options["renders"]))
+        if options["processes"]:
+            pool.shutdown()
+
+    def measure(self, render: Callable[[], bytes], renders: int) -> list[float]:
+        render()  # warm up, the first render of every mode is excluded
+        durations = []
+        for _ in range(renders):
+            started_at = time.perf_counter()
+            render()
+            durations.append((time.perf_counter() - started_at) * 1000)
+        return durations
+
+    def report(self, name: str, durations: list[float]):
+        p95 = statistics.quantiles(durations, n=20)[-1] if len(durations) > 1 else durations[0]
+        self.stdout.write(
+            f"{name}: renders={len(durations)} mean={statistics.mean(durations):.1f}ms "
+            f"median={statistics.median(durations):.1f}ms p95={p95:.1f}ms"
+        )
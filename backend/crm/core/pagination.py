@@ -1,7 +1,19 @@
+import hashlib
+import json
 import math
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from collections import OrderedDict
+from functools import cached_property, partial
 from typing import Any
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
 from rest_framework.pagination import LimitOffsetPagination as _LimitOffsetPagination
 from rest_framework.pagination import PageNumberPagination as _PageNumberPagination
 from rest_framework.response import Response
@@ -21,9 +33,131 @@ def get_paginated_response(*, pagination_class, serializer_class, queryset, requ
     return Response(data=serializer.data)
 
 
+class KeysetPagination(BasePagination):
+    """
+    Pagination by the values of [ordering] fields of the boundary row instead of OFFSET,
+    so every page costs the same index range scan however deep it is. No count is made.
+    Ordering of the queryset is replaced by [ordering], its last field must be unique.
+    Client gets opaque nextCursor/previousCursor and passes one of them by ?cursor= param.
+    """
+
+    page_size = 20
+    max_page_size = 50
+    cursor_query_param = "cursor"
+    ordering = ("-created_at", "-id")
+
+    def get_page_size(self, request):
+        if "itemsPerPage" in request.query_params:
+            page_size = int(request.query_params["itemsPerPage"])
+            return min(page_size, self.max_page_size)
+        return self.page_size
+
+    def encode_cursor(self, row, reverse: bool) -> str:
+        # value_to_string keeps microseconds of datetimes, unlike json encoder
+        values = [row._meta.get_field(field.lstrip("-")).value_to_string(row) for field in self.ordering]
+        payload = json.dumps({"v": values, "r": reverse}, separators=(",", ":"))
+        return urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor: str, model) -> tuple[list, bool]:
+        try:
+            payload = json.loads(urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            fields = [model._meta.get_field(field.lstrip("-")) for field in self.ordering]
+            if len(payload["v"]) != len(fields):
+                raise ValueError(cursor)
+            values = [field.to_python(value) for field, value in zip(fields, payload["v"])]
+            return values, bool(payload["r"])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound("Invalid cursor")
+
+    def get_keyset_filter(self, values: list, reverse: bool) -> Q:
+        """Rows after [values] in [ordering], before them if [reverse]: (a > x) | (a = x & b > y) | ..."""
+        condition, equal, bound = Q(), Q(), None
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") != reverse else "gt"
+            condition |= equal & Q(**{f"{name}__{lookup}": value})
+            equal &= Q(**{name: value})
+            # Inclusive bound of the leading field lets the index range scan start at the cursor
+            bound = bound or Q(**{f"{name}__{lookup}e": value})
+        return bound & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        values, reverse = self.decode_cursor(cursor, queryset.model) if cursor else (None, False)
+
+        ordering = [field[1:] if field.startswith("-") else f"-{field}" for field in self.ordering]
+        queryset = queryset.order_by(*(ordering if reverse else self.ordering))
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values, reverse))
+
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+        has_next, has_previous = (True, has_more) if reverse else (has_more, values is not None)
+
+        self.next_cursor = self.encode_cursor(rows[-1], reverse=False) if rows and has_next else None
+        self.previous_cursor = self.encode_cursor(rows[0], reverse=True) if rows and has_previous else None
+        return rows
+
+    def get_paginated_response(self, data: Any) -> Response:
+        return Response(
+            OrderedDict(
+                [
+                    ("nextCursor", self.next_cursor),
+                    ("previousCursor", self.previous_cursor),
+                    ("itemsPerPage", self.page_size),
+                    ("items", data),
+                ]
+            )
+        )
+
+
+class Paginator(DjangoPaginator):
+    """Django paginator with the count of object list given by [count_function]"""
+
+    def __init__(self, *args, count_function=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_function = count_function
+
+    @cached_property
+    def count(self):
+        if self.count_function is None:
+            return super().count
+        return self.count_function(self.object_list)
+
+
+def queryset_count_cache_key(queryset: QuerySet) -> str:
+    """Cache key of the queryset count by its SQL, which includes tenant and filters"""
+    sql, params = queryset.order_by().query.sql_with_params()
+    query_hash = hashlib.sha256(f"{sql}{params!r}".encode()).hexdigest()
+    return f"pagination_count:{queryset.model._meta.label_lower}:{query_hash}"
+
+
+def queryset_count_estimate(queryset: QuerySet) -> int:
+    """Number of rows expected by the query planner, no rows are read"""
+    plan = json.loads(queryset.order_by().explain(format="json"))
+    return plan[0]["Plan"]["Plan Rows"]
+
+
 class PageNumberPagination(_PageNumberPagination):
+    """
+    [count_strategy] of the total count:
+    exact - COUNT(*) on every request.
+    cached - COUNT(*) kept in the cache by SQL of the queryset for PAGINATION_COUNT_CACHE_TIMEOUT seconds.
+    estimated - row estimate of the query planner, exact COUNT(*) if it is below PAGINATION_COUNT_ESTIMATE_THRESHOLD.
+    countExact of the response is false if the count is estimated, last pages of such count may be off.
+    Pages past the estimate fall back to the exact count, so an underestimate does not make them 404.
+    """
+
     page_size = 20
     max_page_size = 50
+    count_strategy = "exact"
+    # Opt-in KeysetPagination subclass, used instead when request has ?cursor= param, empty for the first page
+    keyset_pagination_class = None
 
     def get_page_size(self, request):
         if "itemsPerPage" in request.query_params:
@@ -31,7 +165,53 @@ class PageNumberPagination(_PageNumberPagination):
             return min(page_size, self.max_page_size)
         return self.page_size
 
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_paginator = None
+        keyset_pagination_class = self.keyset_pagination_class
+        if keyset_pagination_class and keyset_pagination_class.cursor_query_param in request.query_params:
+            self.keyset_paginator = keyset_pagination_class()
+            self.keyset_paginator.page_size = self.page_size
+            self.keyset_paginator.max_page_size = self.max_page_size
+            return self.keyset_paginator.paginate_queryset(queryset, request, view=view)
+        self.request = request
+        self.count_exact = True
+        self.django_paginator_class = partial(Paginator, count_function=self.get_count)
+        return super().paginate_queryset(queryset, request, view=view)
+
+    def get_count(self, queryset: QuerySet) -> int:
+        if self.count_strategy == "cached":
+            try:
+                cache_key = queryset_count_cache_key(queryset)
+            except EmptyResultSet:
+                return 0
+            count = cache.get(cache_key)
+            if count is None:
+                count = queryset.count()
+                cache.set(cache_key, count, timeout=settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+            return count
+        if self.count_strategy == "estimated":
+            try:
+                estimate = queryset_count_estimate(queryset)
+            except EmptyResultSet:
+                return 0
+            if estimate >= settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD and not self.is_page_past_count(
+                estimate
+            ):
+                self.count_exact = False
+                return estimate
+        return queryset.count()
+
+    def is_page_past_count(self, count: int) -> bool:
+        """Requested page starts after [count] rows, Django paginator raises EmptyPage for it"""
+        try:
+            page_number = int(self.request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            return False
+        return (page_number - 1) * self.get_page_size(self.request) >= count
+
     def get_paginated_response(self, data: Any) -> Response:
+        if self.keyset_paginator is not None:
+            return self.keyset_paginator.get_paginated_response(data)
         page_size = self.get_page_size(self.request)
 
         return Response(
@@ -39,6 +219,7 @@ class PageNumberPagination(_PageNumberPagination):
                 [
                     ("count", self.page.paginator.count),
                     ("countPages", math.ceil(self.page.paginator.count / page_size)),
+                    ("countExact", self.count_exact),
                     ("page", int(self.request.query_params.get(self.page_query_param, 1))),
                     ("itemsPerPage", page_size),
                     ("items", data),
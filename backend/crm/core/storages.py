@@ -1,4 +1,5 @@
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
 
 
 class StaticRootS3Boto3Storage(S3Boto3Storage):
@@ -9,3 +10,17 @@ class StaticRootS3Boto3Storage(S3Boto3Storage):
 class MediaRootS3Boto3Storage(S3Boto3Storage):
     location = "media"
     file_overwrite = False
+
+    def presigned_url(self, name: str, expire: int = None, parameters: dict = None) -> str:
+        """
+        Signed url of the object, even if querystring auth is disabled for public urls.
+        Downloads are redirected to it, so file bytes never pass through Django.
+        """
+        params = {
+            "Bucket": self.bucket.name,
+            "Key": self._normalize_name(clean_name(name)),
+            **(parameters or {}),
+        }
+        return self.bucket.meta.client.generate_presigned_url(
+            "get_object", Params=params, ExpiresIn=expire or self.querystring_expire
+        )
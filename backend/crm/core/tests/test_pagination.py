@@ -1,6 +1,8 @@
 from collections import OrderedDict
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 from rest_framework import serializers
 from rest_framework.permissions import AllowAny
@@ -9,7 +11,7 @@ from rest_framework.views import APIView
 
 from crm.users.tests.factories import UserFactory
 
-from ..pagination import LimitOffsetPagination, get_paginated_response
+from ..pagination import KeysetPagination, LimitOffsetPagination, PageNumberPagination, get_paginated_response
 
 User = get_user_model()
 
@@ -39,6 +41,36 @@ class ExampleListApi(APIView):
         return response
 
 
+class ExampleKeysetListApi(ExampleListApi):
+    class Pagination(PageNumberPagination):
+        page_size = 2
+        keyset_pagination_class = KeysetPagination
+
+    def get(self, request):
+        return get_paginated_response(
+            pagination_class=self.Pagination,
+            serializer_class=self.OutputSerializer,
+            queryset=User.objects.all(),
+            request=request,
+            view=self,
+        )
+
+
+class ExampleCountListApi(ExampleListApi):
+    def get(self, request):
+        class Pagination(PageNumberPagination):
+            page_size = 1
+            count_strategy = request.query_params["countStrategy"]
+
+        return get_paginated_response(
+            pagination_class=Pagination,
+            serializer_class=self.OutputSerializer,
+            queryset=User.objects.filter(email__contains=request.query_params.get("email", "")),
+            request=request,
+            view=self,
+        )
+
+
 class GetPaginatedResponseTests(TestCase):
     def setUp(self):
         self.factory = APIRequestFactory()
@@ -92,3 +124,92 @@ class GetPaginatedResponseTests(TestCase):
         )
 
         self.assertEqual(expected_next_page_response, next_page_response.data)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        UserFactory.create_batch(4)
+        # Rows with equal created_at are ordered by id
+        User.objects.update(created_at=User.objects.first().created_at)
+        self.user_ids = list(User.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+    def get_page(self, **params) -> dict:
+        request = self.factory.get("/some/path", params)
+        return ExampleKeysetListApi.as_view()(request).data
+
+    def test_page_number_without_cursor(self):
+        response = self.get_page()
+        self.assertEqual(response["count"], len(self.user_ids))
+
+    def test_pages(self):
+        user_ids = []
+        response = self.get_page(cursor="")
+        self.assertIsNone(response["previousCursor"])
+        while True:
+            user_ids += [item["id"] for item in response["items"]]
+            if not response["nextCursor"]:
+                break
+            response = self.get_page(cursor=response["nextCursor"])
+        self.assertEqual(user_ids, self.user_ids)
+        # Test previous page is the same going back
+        response = self.get_page(cursor=response["previousCursor"])
+        self.assertEqual([item["id"] for item in response["items"]], self.user_ids[-4:-2])
+        self.assertTrue(response["nextCursor"])
+
+    def test_items_per_page(self):
+        response = self.get_page(cursor="", itemsPerPage=3)
+        self.assertEqual([item["id"] for item in response["items"]], self.user_ids[:3])
+        self.assertEqual(response["itemsPerPage"], 3)
+
+    def test_invalid_cursor(self):
+        request = self.factory.get("/some/path", {"cursor": "invalid"})
+        response = ExampleKeysetListApi.as_view()(request)
+        self.assertEqual(response.status_code, 404)
+
+
+class CountStrategyTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        UserFactory.create_batch(2)
+        cache.clear()
+
+    def get_page(self, **params) -> dict:
+        request = self.factory.get("/some/path", params)
+        return ExampleCountListApi.as_view()(request).data
+
+    def test_exact(self):
+        response = self.get_page(countStrategy="exact")
+        self.assertEqual(response["count"], User.objects.count())
+        self.assertEqual(response["countPages"], User.objects.count())
+        self.assertTrue(response["countExact"])
+
+    def test_cached(self):
+        count = User.objects.count()
+        self.assertEqual(self.get_page(countStrategy="cached")["count"], count)
+        UserFactory()
+        # Test count is cached by the queryset
+        with self.assertNumQueries(1):
+            response = self.get_page(countStrategy="cached")
+        self.assertEqual(response["count"], count)
+        self.assertTrue(response["countExact"])
+        response = self.get_page(countStrategy="cached", email="@")
+        self.assertEqual(response["count"], count + 1)
+
+    def test_estimated(self):
+        response = self.get_page(countStrategy="estimated")
+        self.assertEqual(response["count"], User.objects.count())
+        self.assertTrue(response["countExact"])
+        with self.settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=0):
+            response = self.get_page(countStrategy="estimated")
+        self.assertFalse(response["countExact"])
+        self.assertGreater(response["count"], 0)
+
+    @patch("crm.core.pagination.queryset_count_estimate", return_value=1)
+    def test_estimated_page_past_estimate(self, _):
+        # Test page past the underestimated count is served with the exact count
+        with self.settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=0):
+            response = self.get_page(countStrategy="estimated", page=2)
+        self.assertEqual(len(response["items"]), 1)
+        self.assertEqual(response["count"], User.objects.count())
+        self.assertTrue(response["countExact"])
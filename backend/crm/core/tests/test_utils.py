@@ -1,7 +1,48 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from io import BytesIO, StringIO
+from unittest.mock import Mock, patch
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
 from django.test import TestCase
+from docx import Document as DocxDocument
+from pypdf import PdfReader
 from qrcode.image.pil import PilImage
 
-from ..utils import convert_img_to_base64, generate_qr_code
+from crm.companies.tests.factories import CompanyMemberFactory, ProductFactory, UserFactory
+
+from ..utils import (
+    DocxImage,
+    DocxRenderer,
+    LocalURLFetcher,
+    PDFRenderer,
+    chunked,
+    convert_img_to_base64,
+    create_pdf_render_pool,
+    data_uri_to_bytes,
+    find_stylesheets,
+    generate_qr_code,
+    get_pdf_render_pool,
+    get_pdf_renderer,
+    html_string_to_pdf,
+    html_to_text,
+    iter_html_strings_to_pdf,
+    iter_json_array,
+    merge_pdf_files,
+    pdf_cache_key,
+    qr_code_cache_key,
+    qr_code_data_uri,
+    qr_codes_precompute,
+    render_docx,
+    render_pdf,
+    use_pdf_render_pool,
+)
 
 
 class TestUtils(TestCase):
@@ -17,3 +58,218 @@ class TestUtils(TestCase):
         qr_code_base64 = convert_img_to_base64(qr_code)
         self.assertIn("data:image/png;base64,", qr_code_base64)
         self.assertIsInstance(qr_code_base64, str)
+
+    def test_qr_code_data_uri(self):
+        qr_code_data_uri.cache_clear()
+        data_uri = qr_code_data_uri("https://example.com/qr-code")
+        self.assertEqual(data_uri, convert_img_to_base64(generate_qr_code("https://example.com/qr-code")))
+        self.assertEqual(cache.get(qr_code_cache_key("https://example.com/qr-code")), data_uri)
+        # Test memoized and cached data uri is returned
+        cache.set(qr_code_cache_key("https://example.com/qr-code"), "cached")
+        self.assertEqual(qr_code_data_uri("https://example.com/qr-code"), data_uri)
+        qr_code_data_uri.cache_clear()
+        self.assertEqual(qr_code_data_uri("https://example.com/qr-code"), "cached")
+        self.assertNotEqual(qr_code_data_uri("https://example.com/qr-code", box_size=4), "cached")
+        cache.delete(qr_code_cache_key("https://example.com/qr-code"))
+
+    def test_qr_codes_precompute(self):
+        urls = ["https://example.com/qr-code-1", "https://example.com/qr-code-2", ""]
+        self.assertEqual(qr_codes_precompute(urls), 2)
+        self.assertIsNotNone(cache.get(qr_code_cache_key(urls[0])))
+        # Test cached codes are not generated again
+        self.assertEqual(qr_codes_precompute(urls + ["https://example.com/qr-code-3"]), 1)
+        cache.clear()
+
+    def test_chunked(self):
+        self.assertEqual(list(chunked(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(chunked([], 2)), [])
+
+    def test_iter_json_array(self):
+        items = [{"id": 1, "name": "Бренд"}, [1, 2], "test", 12345, 1.5, True, None, {}]
+        data = json.dumps(items, ensure_ascii=False, indent=2).encode("utf-8")
+        test_cases = [  # chunk_size
+            1,
+            3,
+            len(data),
+        ]
+        for chunk_size in test_cases:
+            chunks = (bytes(chunk) for chunk in chunked(data, chunk_size))
+            self.assertEqual(list(iter_json_array(chunks)), items, chunk_size)
+
+    def test_iter_json_array_invalid(self):
+        test_cases = [  # chunks
+            [b'{"id": 1}'],
+            [b'[{"id": 1}, {"id"'],
+            [b'[{"id": 1}'],
+        ]
+        for chunks in test_cases:
+            with self.assertRaises(json.JSONDecodeError):
+                list(iter_json_array(chunks))
+
+    def test_pdf_cache_key(self):
+        html = "<p>Тест</p>"
+        css_paths = find_stylesheets("css/pdf.css")
+        cache_key = pdf_cache_key(html, css_paths, "http://testserver/")
+        self.assertEqual(cache_key, pdf_cache_key(html, css_paths, "http://testserver/"))
+        test_cases = [  # (html, css_paths, base_url)
+            ("<p>Тест 1</p>", css_paths, "http://testserver/"),
+            (html, None, "http://testserver/"),
+            (html, css_paths, "http://otherserver/"),
+        ]
+        for args in test_cases:
+            self.assertNotEqual(cache_key, pdf_cache_key(*args), args)
+
+    def test_html_string_to_pdf_cache(self):
+        html = "<p>Тест</p>"
+        cache_key = pdf_cache_key(html)
+        pdf_file = html_string_to_pdf(html, cache_key=cache_key)
+        self.assertEqual(cache.get(f"pdf:{cache_key}"), pdf_file)
+        # Test cached PDF is returned
+        cache.set(f"pdf:{cache_key}", b"cached")
+        self.assertEqual(html_string_to_pdf(html, cache_key=cache_key), b"cached")
+        self.assertNotEqual(html_string_to_pdf(html), b"cached")
+        cache.delete(f"pdf:{cache_key}")
+
+    def test_pdf_renderer_stylesheets(self):
+        renderer = PDFRenderer()
+        with tempfile.TemporaryDirectory() as directory:
+            css_path = shutil.copy(find_stylesheets("css/pdf.css")[0], directory)
+            stylesheet = renderer.get_stylesheet(css_path)
+            self.assertIs(renderer.get_stylesheet(css_path), stylesheet)
+            # Test changed stylesheet is parsed again
+            stat = os.stat(css_path)
+            os.utime(css_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+            self.assertIsNot(renderer.get_stylesheet(css_path), stylesheet)
+            self.assertTrue(renderer.render("<p>Тест</p>", [css_path]))
+
+    def test_local_url_fetcher(self):
+        fallback_urls = []
+
+        def fallback(url, **kwargs):
+            fallback_urls.append(url)
+            return {"string": b""}
+
+        url_fetcher = LocalURLFetcher("http://testserver/products/1/price/", fallback=fallback)
+        with tempfile.TemporaryDirectory() as directory, self.settings(MEDIA_ROOT=directory):
+            name = default_storage.save("pdf_blocks/логотип.png", ContentFile(b"image"))
+            result = url_fetcher(f"http://testserver{default_storage.url(name)}")
+            self.assertEqual(result["string"], b"image")
+            self.assertEqual(result["mime_type"], "image/png")
+            # Test missing media file is fetched by fallback
+            url_fetcher("http://testserver/media/pdf_blocks/missing.png")
+        with open(find_stylesheets("css/pdf.css")[0], "rb") as file:
+            self.assertEqual(url_fetcher("http://testserver/static/css/pdf.css")["string"], file.read())
+        # Test other urls are fetched by fallback
+        url_fetcher("http://otherserver/media/logo.png")
+        url_fetcher("data:text/plain,test")
+        self.assertEqual(
+            fallback_urls,
+            [
+                "http://testserver/media/pdf_blocks/missing.png",
+                "http://otherserver/media/logo.png",
+                "data:text/plain,test",
+            ],
+        )
+
+    def test_pdf_renderer_images(self):
+        renderer = PDFRenderer()
+        renderer.images["http://testserver/media/logo.png"] = object()
+        with self.settings(PDF_IMAGE_CACHE_SIZE=0):
+            renderer.render("<p>Тест</p>")
+        self.assertNotIn("http://testserver/media/logo.png", renderer.images)
+
+    def test_get_pdf_renderer(self):
+        renderer = get_pdf_renderer()
+        self.assertIs(get_pdf_renderer(), renderer)
+        other_renderers = []
+        thread = threading.Thread(target=lambda: other_renderers.append(get_pdf_renderer()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other_renderers[0], renderer)
+
+    def test_pdf_render_pool(self):
+        html, css_paths = "<p>Тест</p>", find_stylesheets("css/pdf.css")
+        with create_pdf_render_pool(1) as pool:
+            pdf_file = pool.submit(render_pdf, html, css_paths, "http://testserver/").result()
+        self.assertTrue(pdf_file.startswith(b"%PDF"))
+
+    def test_iter_html_strings_to_pdf(self):
+        htmls = ["<p>Тест 1</p>", "<p>Тест 2</p>"]
+        for processes in (0, 1):
+            with self.settings(PDF_RENDER_PROCESSES=processes):
+                pdf_files = list(iter_html_strings_to_pdf(htmls, base_url="http://testserver/"))
+            self.assertEqual(len(pdf_files), 2, processes)
+            self.assertTrue(all(pdf_file.startswith(b"%PDF") for pdf_file in pdf_files), processes)
+        get_pdf_render_pool().shutdown()
+        get_pdf_render_pool.cache_clear()
+
+    def test_use_pdf_render_pool(self):
+        test_cases = [  # processes, is_daemon, expected_result
+            (0, False, False),
+            (1, False, True),
+            (1, True, False),
+        ]
+        for processes, is_daemon, expected_result in test_cases:
+            with self.settings(PDF_RENDER_PROCESSES=processes), patch(
+                "crm.core.utils.current_process", return_value=Mock(daemon=is_daemon)
+            ):
+                self.assertEqual(use_pdf_render_pool(), expected_result)
+
+    def test_merge_pdf_files(self):
+        pdf_files = [render_pdf("<p>Тест 1</p>"), render_pdf("<p>Тест 2</p>")]
+        pdf_file = merge_pdf_files(pdf_files)
+        self.assertTrue(pdf_file.startswith(b"%PDF"))
+        self.assertEqual(len(PdfReader(BytesIO(pdf_file)).pages), 2)
+
+    def test_render_docx(self):
+        product = ProductFactory(name="Товар & <тест>")
+        context = {"user": UserFactory(), "company": product.company, "product": product, "pdf_blocks": []}
+        content = render_docx("commercial-offers/1.docx", context)
+        text = "\n".join(paragraph.text for paragraph in DocxDocument(BytesIO(content)).paragraphs)
+        self.assertIn("Товар & <тест>", text)
+        for key, value in product.data_translated.items():
+            self.assertIn(f"{key} - {value}", text)
+
+    def test_render_docx_image(self):
+        product = ProductFactory()
+        context = {
+            "user": UserFactory(),
+            "company": product.company,
+            "product": product,
+            "pdf_blocks": [{"name": "Блок", "text": "Строка 1\nСтрока 2"}],
+            "qr_code": DocxImage(data_uri_to_bytes(qr_code_data_uri(product.url)), width_mm=30),
+        }
+        document = DocxDocument(BytesIO(render_docx("commercial-offers/1.docx", context)))
+        self.assertEqual(len(document.inline_shapes), 1)
+        self.assertIn("Строка 1\nСтрока 2", [paragraph.text for paragraph in document.paragraphs])
+
+    def test_html_to_text(self):
+        test_cases = [  # html, expected_result
+            ("<p>Тест &amp; <b>тест</b></p>", "Тест & тест"),
+            ("<p>Строка 1</p><p>Строка 2<br>Строка 3</p>", "Строка 1\nСтрока 2\nСтрока 3"),
+            ("", ""),
+        ]
+        for html, expected_result in test_cases:
+            self.assertEqual(html_to_text(html), expected_result)
+
+    def test_docx_renderer_templates(self):
+        renderer = DocxRenderer()
+        context = {"user": None, "company": None, "product": ProductFactory(), "pdf_blocks": []}
+        content = renderer.render("price-lists/1.docx", context)
+        path, (mtime, template_content) = next(iter(renderer.templates.items()))
+        compiled_templates = renderer.jinja_env.compile_string.cache_info().currsize
+        # Test template file and compiled xml are reused
+        self.assertTrue(content.startswith(b"PK"))
+        renderer.render("price-lists/1.docx", context)
+        self.assertIs(renderer.templates[path][1], template_content)
+        self.assertEqual(renderer.jinja_env.compile_string.cache_info().currsize, compiled_templates)
+        self.assertGreater(renderer.jinja_env.compile_string.cache_info().hits, 0)
+
+    def test_benchmark_pdf_command(self):
+        product = ProductFactory()
+        CompanyMemberFactory(company=product.company)
+        stdout = StringIO()
+        call_command("benchmark_pdf", renders=2, stdout=stdout)
+        output = stdout.getvalue()
+        self.assertIn("cold: renders=2", output)
+        self.assertIn("warm: renders=2", output)
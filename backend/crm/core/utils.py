@@ -1,18 +1,123 @@
 import base64
+import codecs
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from html import unescape
 from io import BytesIO
+from itertools import chain, islice, repeat
+from multiprocessing import current_process, get_context
+from typing import NamedTuple
+from urllib.parse import unquote, urljoin, urlsplit
 
+import bleach
+import django
 import qrcode
 from django.conf import settings
 from django.contrib.staticfiles.finders import find
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
 from django.http import HttpRequest
 from django.template.loader import render_to_string
-from docxtpl import DocxTemplate
+from django.utils.html import strip_tags
+from django_bleach.utils import get_bleach_default_options
+from docx.shared import Mm
+from docxtpl import DocxTemplate, InlineImage
+from jinja2 import Environment
+from pypdf import PdfWriter
 from qrcode.image.pil import PilImage
-from weasyprint import HTML
+from weasyprint import CSS, HTML, Document, default_url_fetcher
+from weasyprint.text.fonts import FontConfiguration
 
 
-def generate_qr_code(data: str) -> PilImage:
-    qr = qrcode.QRCode(version=1, box_size=6, border=1)
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    """Split iterable into lists of [size] items, the last list may be shorter"""
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+JSON_DELIMITER = re.compile(r"[ \t\n\r,\]]")
+
+
+def iter_json_array(chunks: Iterable[bytes | str]) -> Iterator:
+    """
+    Incrementally parse top-level JSON array from utf-8 chunks and yield its items one by one.
+    Only a single item and the current chunk are held in memory.
+    Raise json.JSONDecodeError for malformed or truncated input.
+    """
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer, index = "", 0
+    is_started = False
+
+    for chunk in chain(chunks, [None]):
+        is_eof = chunk is None
+        if is_eof:
+            buffer += utf8_decoder.decode(b"", final=True)
+        else:
+            buffer += chunk if isinstance(chunk, str) else utf8_decoder.decode(chunk)
+
+        while True:
+            index = JSON_WHITESPACE.match(buffer, index).end()
+            if index == len(buffer):
+                break
+            char = buffer[index]
+            if not is_started:
+                if char != "[":
+                    raise json.JSONDecodeError("Expecting JSON array", buffer, index)
+                is_started = True
+                index += 1
+                continue
+            if char == "]":
+                return
+            if char == ",":
+                index += 1
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, index)
+            except json.JSONDecodeError:
+                if is_eof:
+                    raise
+                break  # wait for more data
+            if (
+                not isinstance(item, (dict, list, str))
+                and not is_eof
+                and not JSON_DELIMITER.match(buffer, end)
+            ):
+                break  # number or literal may continue in the next chunk
+            yield item
+            index = end
+
+        buffer, index = buffer[index:], 0
+
+    raise json.JSONDecodeError("Unexpected end of JSON array", buffer, index)
+
+
+def sanitize_html(html: str) -> str:
+    """Clean html by BLEACH_* settings, same as the bleach template filter"""
+    return bleach.clean(html, **get_bleach_default_options())
+
+
+HTML_LINE_BREAK = re.compile(r"<br\s*/?>|</(p|div|li|h[1-6])>", re.IGNORECASE)
+
+
+def html_to_text(html: str) -> str:
+    """Plain text of sanitized html for DOCX templates, paragraphs and line breaks are kept as new lines"""
+    return unescape(strip_tags(HTML_LINE_BREAK.sub("\n", html))).strip()
+
+
+def generate_qr_code(data: str, box_size: int = 6, border: int = 1) -> PilImage:
+    qr = qrcode.QRCode(version=1, box_size=box_size, border=border)
     qr.add_data(data)
     qr.make(fit=True)
     qr_img = qr.make_image(fill_color="black", back_color="white")
@@ -26,26 +131,351 @@ def convert_img_to_base64(img: PilImage) -> str:
     return img
 
 
-def html_to_pdf(
-    request: HttpRequest, template_path: str, context: dict, css_paths: list[str] = None
-) -> bytes:
+def qr_code_cache_key(data: str, box_size: int = 6, border: int = 1) -> str:
+    return f"qr_code:{box_size}:{border}:{hashlib.sha256(data.encode('utf-8')).hexdigest()}"
+
+
+@lru_cache(maxsize=1024)
+def qr_code_data_uri(data: str, box_size: int = 6, border: int = 1) -> str:
+    """
+    Base64 PNG data uri of QR code, memoized in process and kept in the shared cache for QR_CODE_CACHE_TIMEOUT.
+    Same [data] always gives the same image, so cached codes are never invalidated.
+    """
+    key = qr_code_cache_key(data, box_size, border)
+    data_uri = cache.get(key)
+    if data_uri is None:
+        data_uri = convert_img_to_base64(generate_qr_code(data, box_size, border))
+        cache.set(key, data_uri, timeout=settings.QR_CODE_CACHE_TIMEOUT)
+    return data_uri
+
+
+def data_uri_to_bytes(data_uri: str) -> bytes:
+    """Content of base64 data uri, e.g. made by qr_code_data_uri"""
+    return base64.b64decode(data_uri.partition(",")[2])
+
+
+def qr_codes_precompute(data: Iterable[str], box_size: int = 6, border: int = 1) -> int:
+    """Put QR codes missing in the shared cache with a single lookup, return number of generated codes"""
+    keys = {qr_code_cache_key(item, box_size, border): item for item in set(data) if item}
+    missing = keys.keys() - cache.get_many(keys.keys()).keys()
+    data_uris = {key: convert_img_to_base64(generate_qr_code(keys[key], box_size, border)) for key in missing}
+    cache.set_many(data_uris, timeout=settings.QR_CODE_CACHE_TIMEOUT)
+    return len(data_uris)
+
+
+@lru_cache(maxsize=256)
+def find_static(path: str) -> str | None:
+    """staticfiles find() walks every finder, static files are resolved once per process"""
+    return find(path)
+
+
+def find_stylesheets(css_paths: list[str] | str | None) -> list[str] | None:
+    """Resolve static paths of stylesheets to files"""
     if isinstance(css_paths, str):
         css_paths = [css_paths]
     if css_paths is not None:
-        css_paths = [find(path) for path in css_paths]
+        css_paths = [find_static(path) for path in css_paths]
+    return css_paths
 
-    template = render_to_string(template_path, context)
-    pdf_file = HTML(string=template, base_url=request.build_absolute_uri()).write_pdf(stylesheets=css_paths)
+
+def open_static(name: str):
+    path = find_static(name)
+    return open(path, "rb") if path else staticfiles_storage.open(name)
+
+
+class LocalURLFetcher:
+    """
+    WeasyPrint url fetcher, media and static urls are read from the storages instead of HTTP,
+    relative MEDIA_URL and STATIC_URL are resolved against [base_url].
+    Other urls and files missing in the storages are fetched by [fallback].
+    """
+
+    def __init__(self, base_url: str = None, fallback=default_url_fetcher):
+        self.openers = [
+            (urljoin(base_url or "", settings.MEDIA_URL), default_storage.open),
+            (urljoin(base_url or "", settings.STATIC_URL), open_static),
+        ]
+        self.fallback = fallback
+
+    def __call__(self, url: str, timeout: int = 10, ssl_context=None) -> dict:
+        for prefix, open_file in self.openers:
+            if not url.startswith(prefix):
+                continue
+            name = unquote(urlsplit(url.removeprefix(prefix)).path)
+            try:
+                with open_file(name) as file:
+                    string = file.read()
+            except (OSError, SuspiciousFileOperation):
+                break
+            return {"string": string, "mime_type": mimetypes.guess_type(name)[0], "redirected_url": url}
+        return self.fallback(url, timeout=timeout, ssl_context=ssl_context)
+
+
+class PDFRenderer:
+    """
+    Long-lived WeasyPrint renderer.
+    Font configuration, parsed stylesheets and decoded images are reused between renders,
+    stylesheet is parsed again only if its file is changed.
+    Images are cached by url, media files are not overwritten, so url of the changed image is changed too.
+    Renderer is not thread-safe, use get_pdf_renderer() for the renderer of the current thread.
+    """
+
+    def __init__(self):
+        self.font_config = FontConfiguration()
+        self.stylesheets = {}  # file path: (mtime, CSS)
+        self.images = {}  # url: image, shared by WeasyPrint with its image data
+
+    def get_stylesheet(self, css_path: str) -> CSS:
+        mtime = os.stat(css_path).st_mtime_ns
+        cached = self.stylesheets.get(css_path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, CSS(filename=css_path, font_config=self.font_config))
+            self.stylesheets[css_path] = cached
+        return cached[1]
+
+    def render_document(self, html: str, css_paths: list[str] = None, base_url: str = None) -> Document:
+        """Lay out html without writing PDF"""
+        stylesheets = [self.get_stylesheet(css_path) for css_path in css_paths or []]
+        if len(self.images) > settings.PDF_IMAGE_CACHE_SIZE:
+            # Images are not evicted one by one, WeasyPrint keeps their data in the same cache
+            self.images.clear()
+        html = HTML(string=html, base_url=base_url, url_fetcher=LocalURLFetcher(base_url))
+        return html.render(stylesheets=stylesheets, font_config=self.font_config, cache=self.images)
+
+    def render(self, html: str, css_paths: list[str] = None, base_url: str = None) -> bytes:
+        """Render html to PDF, [css_paths] must be resolved by find_stylesheets"""
+        return self.render_document(html, css_paths, base_url).write_pdf()
+
+
+pdf_renderers = threading.local()
+
+
+def get_pdf_renderer() -> PDFRenderer:
+    if not hasattr(pdf_renderers, "renderer"):
+        pdf_renderers.renderer = PDFRenderer()
+    return pdf_renderers.renderer
+
+
+def render_pdf(html: str, css_paths: list[str] = None, base_url: str = None) -> bytes:
+    """Render html by the renderer of the current thread, also used as a task of the render pool"""
+    return get_pdf_renderer().render(html, css_paths, base_url)
+
+
+def init_pdf_render_process():
+    django.setup()
+    get_pdf_renderer()
+
+
+def create_pdf_render_pool(processes: int) -> ProcessPoolExecutor:
+    """
+    Pool of warm renderer processes, CPU-heavy layout is moved out of request threads.
+    Processes are spawned, so they do not inherit threads and connections of the parent.
+    """
+    return ProcessPoolExecutor(
+        max_workers=processes, mp_context=get_context("spawn"), initializer=init_pdf_render_process
+    )
+
+
+@lru_cache(maxsize=None)
+def get_pdf_render_pool() -> ProcessPoolExecutor:
+    return create_pdf_render_pool(settings.PDF_RENDER_PROCESSES)
+
+
+def use_pdf_render_pool() -> bool:
+    """
+    Render pool is configured and may be started by the current process.
+    Daemonic processes, e.g. children of celery prefork pool, are not allowed to have children,
+    so they render in the calling thread.
+    """
+    return bool(settings.PDF_RENDER_PROCESSES) and not current_process().daemon
+
+
+def pdf_cache_key(html: str, css_paths: list[str] = None, base_url: str = "") -> str:
+    """
+    Hash of everything the PDF is rendered from: html with resolved context, base url and stylesheets versions.
+    [css_paths] must be resolved by find_stylesheets.
+    """
+    key = hashlib.sha256(html.encode("utf-8"))
+    key.update(base_url.encode("utf-8"))
+    for path in css_paths or []:
+        stat = os.stat(path)
+        key.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}".encode("utf-8"))
+    return key.hexdigest()
+
+
+def html_string_to_pdf(
+    html: str, css_paths: list[str] = None, base_url: str = None, cache_key: str = None
+) -> bytes:
+    """
+    Render html to PDF, [css_paths] must be resolved by find_stylesheets.
+    If [cache_key] is given, PDF is kept in the cache for PDF_CACHE_TIMEOUT seconds.
+    """
+    if cache_key is not None:
+        pdf_file = cache.get(f"pdf:{cache_key}")
+        if pdf_file is not None:
+            return pdf_file
+
+    if use_pdf_render_pool():
+        pdf_file = get_pdf_render_pool().submit(render_pdf, html, css_paths, base_url).result()
+    else:
+        pdf_file = render_pdf(html, css_paths, base_url)
+
+    if cache_key is not None and len(pdf_file) <= settings.PDF_CACHE_MAX_SIZE:
+        cache.set(f"pdf:{cache_key}", pdf_file, timeout=settings.PDF_CACHE_TIMEOUT)
     return pdf_file
 
 
-def render_docx(template_path: str, context: dict) -> bytes:
-    doc = DocxTemplate(str(settings.APPS_DIR / "documents/templates" / template_path))
+def iter_html_strings_to_pdf(
+    htmls: Iterable[str], css_paths: list[str] = None, base_url: str = None
+) -> Iterator[bytes]:
+    """
+    Render many html documents to PDF files in order, [css_paths] must be resolved by find_stylesheets.
+    Documents are rendered in parallel by the render pool if it is configured.
+    """
+    if use_pdf_render_pool():
+        yield from get_pdf_render_pool().map(render_pdf, htmls, repeat(css_paths), repeat(base_url))
+    else:
+        for html in htmls:
+            yield render_pdf(html, css_paths, base_url)
 
-    doc.render(context)
 
+def merge_pdf_files(pdf_files: list[bytes]) -> bytes:
+    """Write pages of all PDF files to a single PDF file"""
+    writer = PdfWriter()
+    for pdf_file in pdf_files:
+        writer.append(BytesIO(pdf_file))
     buffer = BytesIO()
-    doc.save(buffer)
-    buffer.seek(0)
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def html_to_pdf(
+    request: HttpRequest | None,
+    template_path: str,
+    context: dict,
+    css_paths: list[str] = None,
+    base_url: str = None,
+) -> bytes:
+    """
+    Render template to PDF. Relative urls are resolved against [base_url] or the url of [request],
+    so it can be rendered outside of request, e.g. in celery task.
+    """
+    template = render_to_string(template_path, context)
+    base_url = base_url or request.build_absolute_uri()
+    return html_string_to_pdf(template, find_stylesheets(css_paths), base_url)
+
+
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+
+def is_docx_template(template_path: str) -> bool:
+    return template_path.endswith(".docx")
+
+
+class DocxJinjaEnvironment(Environment):
+    """docxtpl compiles xml of every document part on each render, templates compiled from the same xml are reused"""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.compile_string = lru_cache(maxsize=64)(super().from_string)
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals is not None or template_class is not None:
+            return super().from_string(source, globals, template_class)
+        return self.compile_string(source)
+
+
+class DocxImage(NamedTuple):
+    """Image in DOCX template context, DocxRenderer places it as docxtpl InlineImage of the rendered document"""
+
+    content: bytes
+    width_mm: int = None
+
+
+class DocxRenderer:
+    """
+    Long-lived docxtpl renderer, DOCX counterpart of PDFRenderer.
+    Template file is read again only if it is changed, compiled xml parts and output buffer are reused between renders.
+    Renderer is not thread-safe, use get_docx_renderer() for the renderer of the current thread.
+    """
+
+    def __init__(self):
+        self.templates = {}  # file path: (mtime, content)
+        self.jinja_env = DocxJinjaEnvironment(autoescape=True)
+        self.buffer = BytesIO()
+
+    def get_template(self, template_path: str) -> DocxTemplate:
+        path = str(settings.APPS_DIR / "templates" / template_path)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self.templates.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, "rb") as file:
+                cached = (mtime, file.read())
+            self.templates[path] = cached
+        # Rendering changes the document, so it is parsed from the cached content every time
+        return DocxTemplate(BytesIO(cached[1]))
+
+    def render(self, template_path: str, context: dict) -> bytes:
+        doc = self.get_template(template_path)
+        # Inline image belongs to the document it is rendered in
+        context = {
+            key: InlineImage(doc, BytesIO(value.content), width=value.width_mm and Mm(value.width_mm))
+            if isinstance(value, DocxImage)
+            else value
+            for key, value in context.items()
+        }
+        doc.render(context, self.jinja_env)
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        doc.save(self.buffer)
+        return self.buffer.getvalue()
+
+
+docx_renderers = threading.local()
+
+
+def get_docx_renderer() -> DocxRenderer:
+    if not hasattr(docx_renderers, "renderer"):
+        docx_renderers.renderer = DocxRenderer()
+    return docx_renderers.renderer
+
+
+def render_docx(template_path: str, context: dict) -> bytes:
+    """Render DOCX template from the templates directory by the renderer of the current thread"""
+    return get_docx_renderer().render(template_path, context)
+
+
+TASK_PROGRESS_CACHE_KEY = "task_progress"
+TASK_PROGRESS_CACHE_TIMEOUT = 60 * 60 * 24
+TASK_PROGRESS_COUNTERS = ("current", "total", "failed")
+
+
+def task_progress_start(task_id: str, total: int):
+    """
+    Start aggregated progress of task [task_id] fanned out to [total] subtasks.
+    Counters are kept in the shared cache, so subtasks running in parallel workers never overwrite each other.
+    """
+    counters = {"current": 0, "total": total, "failed": 0}
+    cache.set_many(
+        {f"{TASK_PROGRESS_CACHE_KEY}:{task_id}:{key}": value for key, value in counters.items()},
+        timeout=TASK_PROGRESS_CACHE_TIMEOUT,
+    )
+
+
+def task_progress_advance(task_id: str, failed: bool = False):
+    """Count a finished subtask of task [task_id], progress that is not started or expired is ignored"""
+    try:
+        cache.incr(f"{TASK_PROGRESS_CACHE_KEY}:{task_id}:current")
+        if failed:
+            cache.incr(f"{TASK_PROGRESS_CACHE_KEY}:{task_id}:failed")
+    except ValueError:
+        pass
+
 
-    return buffer
+def task_progress(task_id: str) -> dict | None:
+    """Aggregated progress of task [task_id]: {"current": 1, "total": 2, "failed": 0}, None if not started"""
+    keys = {f"{TASK_PROGRESS_CACHE_KEY}:{task_id}:{key}": key for key in TASK_PROGRESS_COUNTERS}
+    values = cache.get_many(keys)
+    if len(values) != len(keys):
+        return None
+    return {keys[key]: value for key, value in values.items()}
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from crm.core.utils import chunked, sanitize_html
+from crm.documents.models import PDFBlock
+
+
+class Command(BaseCommand):
+    help = "Store sanitized html of PDF blocks text, rows without it by default"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all", action="store_true", help="Sanitize all rows, e.g. after BLEACH_* change"
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        pdf_blocks = PDFBlock.objects.only("id", "text", "text_html").order_by("id")
+        if not options["all"]:
+            pdf_blocks = pdf_blocks.filter(text_html="").exclude(text="")
+
+        updated = 0
+        for batch in chunked(pdf_blocks.iterator(chunk_size=options["batch_size"]), options["batch_size"]):
+            for pdf_block in batch:
+                pdf_block.text_html = sanitize_html(pdf_block.text)
+            updated += PDFBlock.objects.bulk_update(batch, fields=["text_html"])
+        self.stdout.write(f"Sanitized PDF blocks: {updated}")
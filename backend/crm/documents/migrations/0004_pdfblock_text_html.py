@@ -0,0 +1,17 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("documents", "0003_alter_pdfblock_text"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pdfblock",
+            name="text_html",
+            field=models.TextField(blank=True, editable=False, verbose_name="Текст HTML"),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.2.3 on 2026-10-18 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("documents", "0004_pdfblock_text_html"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(fields=["created_at", "id"], name="documents_d_created_57d8f5_idx"),
+        ),
+    ]
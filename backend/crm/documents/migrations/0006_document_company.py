@@ -0,0 +1,34 @@
+# Generated by Django 4.2.3 on 2026-10-18 21:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def document_company_backfill(apps, schema_editor):
+    Document = apps.get_model("documents", "Document")
+    Product = apps.get_model("companies", "Product")
+    product_company = Product.objects.filter(pk=models.OuterRef("product_id")).values("company_id")[:1]
+    Document.objects.update(company_id=models.Subquery(product_company))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("companies", "0017_deal_company"),
+        ("documents", "0005_document_created_at_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="company",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="documents",
+                to="companies.company",
+                verbose_name="Компания",
+            ),
+        ),
+        migrations.RunPython(document_company_backfill, migrations.RunPython.noop),
+    ]
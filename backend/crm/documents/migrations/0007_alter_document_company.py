@@ -0,0 +1,25 @@
+# Generated by Django 4.2.3 on 2026-10-18 21:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # separate from the backfill, postgres can't alter the table with pending deferred constraint checks
+    dependencies = [
+        ("documents", "0006_document_company"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="document",
+            name="company",
+            field=models.ForeignKey(
+                editable=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="documents",
+                to="companies.company",
+                verbose_name="Компания",
+            ),
+        ),
+    ]
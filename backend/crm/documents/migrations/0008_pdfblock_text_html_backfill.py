@@ -0,0 +1,45 @@
+# Generated by Django 4.2.3 on 2026-10-18 22:20
+
+import bleach
+from bleach.css_sanitizer import CSSSanitizer
+from django.db import migrations
+
+# Frozen BLEACH_* settings, the same as crm.core.utils.sanitize_html used at the time of the migration
+ALLOWED_TAGS = ["p", "b", "i", "u", "em", "strong", "a"]
+ALLOWED_ATTRIBUTES = ["href", "title", "style"]
+ALLOWED_STYLES = ["font-family", "font-weight", "text-decoration", "font-variant"]
+
+
+def sanitize_html(html: str) -> str:
+    return bleach.clean(
+        html,
+        tags=ALLOWED_TAGS,
+        attributes=ALLOWED_ATTRIBUTES,
+        css_sanitizer=CSSSanitizer(allowed_css_properties=ALLOWED_STYLES),
+        strip=False,
+        strip_comments=False,
+    )
+
+
+def sanitize_pdf_blocks(apps, schema_editor):
+    PDFBlock = apps.get_model("documents", "PDFBlock")
+    pdf_blocks = []
+    for pdf_block in (
+        PDFBlock.objects.filter(text_html="").exclude(text="").only("id", "text").iterator(chunk_size=500)
+    ):
+        pdf_block.text_html = sanitize_html(pdf_block.text)
+        pdf_blocks.append(pdf_block)
+        if len(pdf_blocks) >= 500:
+            PDFBlock.objects.bulk_update(pdf_blocks, ["text_html"])
+            pdf_blocks = []
+    PDFBlock.objects.bulk_update(pdf_blocks, ["text_html"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("documents", "0007_alter_document_company"),
+    ]
+
+    operations = [
+        migrations.RunPython(sanitize_pdf_blocks, migrations.RunPython.noop),
+    ]
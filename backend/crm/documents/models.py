@@ -1,9 +1,11 @@
 from ckeditor.fields import RichTextField
 from django.db import models
 from django.utils.translation import gettext_lazy as _
+from model_utils import FieldTracker
 
 from crm.companies.models import Company, Product
 from crm.core.models import BaseModel
+from crm.core.utils import sanitize_html
 
 
 class PDFBlock(BaseModel):
@@ -14,18 +16,42 @@ class PDFBlock(BaseModel):
     name = models.CharField(_("Наименования"), max_length=150)
     image = models.ImageField(_("Картинка"), upload_to="text-blocks/", null=True, blank=True)
     text = RichTextField(_("Текст"))
+    # text sanitized at write time, so it is rendered without bleach
+    text_html = models.TextField(_("Текст HTML"), blank=True, editable=False)
+    # tracker
+    tracker = FieldTracker(fields=["text"])
 
     def __str__(self):
         return f"{self.company.name} - {self.name}"
 
+    def save(self, *args, **kwargs):
+        if self.tracker.has_changed("text") or (self.text and not self.text_html):
+            self.text_html = sanitize_html(self.text)
+        super().save(*args, **kwargs)
+
 
 class Document(BaseModel):
     class Meta:
         verbose_name_plural = "Documents"
+        indexes = [
+            models.Index(fields=["created_at", "id"]),
+        ]
 
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name=_("Товар"))
+    # company of the product, so documents are filtered by company without join
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name="documents",
+        editable=False,
+        verbose_name=_("Компания"),
+    )
     name = models.CharField(_("Название"), max_length=150)
     url = models.FileField(_("Ссылка"), upload_to="documents/")
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        self.company_id = self.product.company_id
+        super().save(*args, **kwargs)
@@ -1,3 +1,6 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 
 from .factories import CompanyFactory, Document, DocumentFactory, PDFBlock, PDFBlockFactory
@@ -41,6 +44,27 @@ class PDFBlockTests(TestCase):
     def test_str(self):
         self.assertEqual(f"{self.pdf_block.company.name} - {self.pdf_block.name}", str(self.pdf_block))
 
+    def test_text_html(self):
+        self.assertTrue(self.pdf_block.text_html)
+        # Test changed text is sanitized at save
+        self.pdf_block.text = "<p>Текст</p><script>alert(1)</script>"
+        self.pdf_block.save()
+        self.assertIn("<p>Текст</p>", self.pdf_block.text_html)
+        self.assertNotIn("<script>", self.pdf_block.text_html)
+
+    def test_sanitize_pdf_blocks_command(self):
+        PDFBlock.objects.update(text_html="")
+        stdout = StringIO()
+        call_command("sanitize_pdf_blocks", stdout=stdout)
+        self.assertIn(f"Sanitized PDF blocks: {self.init_count}", stdout.getvalue())
+        self.assertFalse(PDFBlock.objects.filter(text_html="").exists())
+        # Test only rows without sanitized text are updated by default
+        stdout = StringIO()
+        call_command("sanitize_pdf_blocks", stdout=stdout)
+        self.assertIn("Sanitized PDF blocks: 0", stdout.getvalue())
+        call_command("sanitize_pdf_blocks", all=True, stdout=stdout)
+        self.assertIn(f"Sanitized PDF blocks: {self.init_count}", stdout.getvalue())
+
 
 class DocumentTests(TestCase):
     def setUp(self) -> None:
@@ -65,6 +89,7 @@ class DocumentTests(TestCase):
 
     def test_fields(self):
         self.assertTrue(self.document.product)
+        self.assertEqual(self.document.company, self.document.product.company)
         self.assertTrue(self.document.name)
         self.assertTrue(self.document.url)
         self.assertTrue(self.document.created_at)